@@ -6,32 +6,36 @@ This module implements a multi-agent system with 4 shark personas:
 - The Customer Advocate (problem clarity, user value)
 - The Skeptic (risks, competition, assumptions)
 
-After all sharks provide feedback, a panel aggregator combines their
-opinions into a final recommendation.
+The four sharks run in parallel; after all of them provide feedback, a
+panel aggregator combines their opinions into a final recommendation.
 """
-import os
+import asyncio
 import json
+import os
+import sqlite3
+import threading
 import time
-from typing import Dict, Literal
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Callable, Dict, Literal, Optional
 from typing_extensions import TypedDict
 
 from pydantic import BaseModel
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.utils.json import parse_partial_json
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
-from groq import RateLimitError
+
+from cache import make_key
+from llm import current_backend, get_llm, structured_chain
+from logging_config import get_logger
+from parsers import TolerantPydanticOutputParser
 
 load_dotenv()
 
-# Initialize LLM with retry logic
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.3,
-    api_key=os.getenv("GROQ_API_KEY"),
-    max_retries=3,
-)
+logger = get_logger(__name__)
 
 
 # ================== STATE DEFINITION ==================
@@ -42,6 +46,11 @@ class PitchState(TypedDict, total=False):
     tone_scores: dict
     analysis: dict
 
+    # Built once per run by the start node: per-persona JSON slices of
+    # tone_scores/analysis, and the compact score summary for the panel
+    persona_context: dict
+    panel_context: str
+
     # Persona outputs
     visionary_feedback: str
     visionary_decision: str
@@ -67,7 +76,7 @@ class PersonaFeedback(BaseModel):
     decision: Literal["Invest", "Not Invest", "Need More Info"]
 
 
-persona_parser = PydanticOutputParser(pydantic_object=PersonaFeedback)
+persona_parser = TolerantPydanticOutputParser(pydantic_object=PersonaFeedback)
 persona_format_instructions = persona_parser.get_format_instructions()
 
 
@@ -78,8 +87,10 @@ persona_prompt = ChatPromptTemplate.from_messages([
      "Your focus: {persona_focus}.\n\n"
      "You will receive:\n"
      "- transcript: full pitch transcript (what the founder said)\n"
-     "- tone_scores: JSON with vocal delivery metrics (confidence, pace, expressiveness, etc.)\n"
-     "- analysis: JSON with content dimension scores and business viability.\n\n"
+     "- tone_scores: JSON with the vocal delivery metrics relevant to your focus (may be empty);\n"
+     "  a segment_timeline, when present, gives per-moment energy/pitch/silence with what was said,\n"
+     "  so you can point at specific moments (e.g. energy dropped during the ask).\n"
+     "- analysis: JSON with the content dimension scores relevant to your focus and business viability.\n\n"
      "Your tasks:\n"
      "1. Read tone_scores and analysis to identify strengths and weaknesses relevant to your focus.\n"
      "2. Generate 1–2 short paragraphs of feedback in your own voice, speaking directly to the founder.\n"
@@ -102,131 +113,122 @@ persona_prompt = ChatPromptTemplate.from_messages([
 ])
 
 
-# ================== PERSONA CHAINS ==================
-visionary_chain = (
-    persona_prompt.partial(
-        persona_name="The Visionary",
-        persona_focus="market potential, long-term upside, and innovation",
-        format_instructions=persona_format_instructions,
-    )
-    | llm
-    | persona_parser
-)
-
-finance_chain = (
-    persona_prompt.partial(
-        persona_name="The Finance Shark",
-        persona_focus="revenue model, pricing, margins, unit economics, and path to profitability",
-        format_instructions=persona_format_instructions,
-    )
-    | llm
-    | persona_parser
-)
-
-customer_chain = (
-    persona_prompt.partial(
-        persona_name="The Customer Advocate",
-        persona_focus="problem clarity, user pain, and whether the solution truly helps customers",
-        format_instructions=persona_format_instructions,
-    )
-    | llm
-    | persona_parser
-)
-
-skeptic_chain = (
-    persona_prompt.partial(
-        persona_name="The Skeptic",
-        persona_focus="risks, hidden assumptions, competition, and reasons this might fail",
-        format_instructions=persona_format_instructions,
-    )
-    | llm
-    | persona_parser
-)
+# ================== PERSONAS ==================
+PERSONAS = {
+    "visionary_chain": ("The Visionary",
+                        "market potential, long-term upside, and innovation"),
+    "finance_chain": ("The Finance Shark",
+                      "revenue model, pricing, margins, unit economics, and path to profitability"),
+    "customer_chain": ("The Customer Advocate",
+                       "problem clarity, user pain, and whether the solution truly helps customers"),
+    "skeptic_chain": ("The Skeptic",
+                      "risks, hidden assumptions, competition, and reasons this might fail"),
+}
+
+
+# ================== CONTEXT SLICING ==================
+# What each shark sees besides the transcript: the content dimensions and tone
+# metrics that matter for its focus. Business viability goes to everyone.
+PERSONA_CONTEXT = {
+    "visionary": {
+        "dimensions": ["market_opportunity", "product_differentiation"],
+        "pitch_structure": True,
+        "tone": ["confidence_score", "expressiveness_score", "delivery_score", "segment_timeline"],
+    },
+    "finance_shark": {
+        "dimensions": ["revenue_logic", "business_model_strength", "market_opportunity"],
+        "pitch_structure": False,
+        "tone": [],
+    },
+    "customer_advocate": {
+        "dimensions": ["problem_clarity", "product_differentiation"],
+        "pitch_structure": True,
+        "tone": ["confidence_score", "speaking_rate"],
+    },
+    "skeptic": {
+        "dimensions": ["competition_awareness", "business_model_strength", "revenue_logic"],
+        "pitch_structure": False,
+        "tone": [],
+    },
+}
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def build_persona_context(tone_scores: Dict, analysis: Dict) -> Dict[str, Dict[str, str]]:
+    """Serialize, once, the slice of tone_scores/analysis each persona gets."""
+    dimensions = analysis.get("dimensions", {})
+    contexts = {}
+    for persona, spec in PERSONA_CONTEXT.items():
+        persona_analysis = {
+            "dimensions": {name: dimensions[name] for name in spec["dimensions"] if name in dimensions},
+            "business_viability": analysis.get("business_viability", {}),
+        }
+        if spec["pitch_structure"]:
+            persona_analysis["pitch_structure"] = analysis.get("pitch_structure", {})
+        contexts[persona] = {
+            "tone_scores": _dumps({k: tone_scores[k] for k in spec["tone"] if k in tone_scores}),
+            "analysis": _dumps(persona_analysis),
+        }
+    return contexts
+
+
+def build_panel_context(tone_scores: Dict, analysis: Dict) -> str:
+    """Scores-only summary for the moderator, who mostly works from the sharks' feedback."""
+    viability = analysis.get("business_viability", {})
+    return _dumps({
+        "dimension_scores": {name: d.get("score") for name, d in analysis.get("dimensions", {}).items()},
+        "structure_quality_score": analysis.get("pitch_structure", {}).get("structure_quality_score"),
+        "viability_score": viability.get("score"),
+        "risk_level": viability.get("risk_level"),
+        "confidence_score": tone_scores.get("confidence_score"),
+        "delivery_score": tone_scores.get("delivery_score"),
+    })
+
+
+def context_node(state: PitchState) -> PitchState:
+    """Entry node: serialize the shared inputs once for the whole panel."""
+    return {
+        "persona_context": build_persona_context(state["tone_scores"], state["analysis"]),
+        "panel_context": build_panel_context(state["tone_scores"], state["analysis"]),
+    }
 
 
 # ================== PERSONA NODE FUNCTIONS ==================
-def visionary_node(state: PitchState) -> PitchState:
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            res = visionary_chain.invoke({
-                "transcript": state["transcript"],
-                "tone_scores": json.dumps(state["tone_scores"], ensure_ascii=False),
-                "analysis": json.dumps(state["analysis"], ensure_ascii=False),
-            })
-            return {
-                "visionary_feedback": res.feedback,
-                "visionary_decision": res.decision,
-            }
-        except RateLimitError as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
-                time.sleep(wait_time)
-            else:
-                raise
-
-
-def finance_node(state: PitchState) -> PitchState:
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            res = finance_chain.invoke({
-                "transcript": state["transcript"],
-                "tone_scores": json.dumps(state["tone_scores"], ensure_ascii=False),
-                "analysis": json.dumps(state["analysis"], ensure_ascii=False),
-            })
-            return {
-                "finance_shark_feedback": res.feedback,
-                "finance_shark_decision": res.decision,
-            }
-        except RateLimitError as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                time.sleep(wait_time)
-            else:
-                raise
-
-
-def customer_node(state: PitchState) -> PitchState:
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            res = customer_chain.invoke({
-                "transcript": state["transcript"],
-                "tone_scores": json.dumps(state["tone_scores"], ensure_ascii=False),
-                "analysis": json.dumps(state["analysis"], ensure_ascii=False),
-            })
-            return {
-                "customer_advocate_feedback": res.feedback,
-                "customer_advocate_decision": res.decision,
-            }
-        except RateLimitError as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                time.sleep(wait_time)
-            else:
-                raise
-
-
-def skeptic_node(state: PitchState) -> PitchState:
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            res = skeptic_chain.invoke({
-                "transcript": state["transcript"],
-                "tone_scores": json.dumps(state["tone_scores"], ensure_ascii=False),
-                "analysis": json.dumps(state["analysis"], ensure_ascii=False),
-            })
-            return {
-                "skeptic_feedback": res.feedback,
-                "skeptic_decision": res.decision,
-            }
-        except RateLimitError as e:
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                time.sleep(wait_time)
-            else:
-                raise
+def _chains(config: RunnableConfig) -> Dict[str, Runnable]:
+    """The chains for this run: without JSON mode when feedback is streamed token by token."""
+    return get_agent_chains(json_mode=not config.get("configurable", {}).get("stream_tokens", False))
+
+
+def _run_persona(state: PitchState, config: RunnableConfig, persona: str, chain_name: str) -> PitchState:
+    context = state["persona_context"][persona]
+    res = _chains(config)[chain_name].invoke({
+        "transcript": state["transcript"],
+        "tone_scores": context["tone_scores"],
+        "analysis": context["analysis"],
+    })
+    return {
+        f"{persona}_feedback": res.feedback,
+        f"{persona}_decision": res.decision,
+    }
+
+
+def visionary_node(state: PitchState, config: RunnableConfig) -> PitchState:
+    return _run_persona(state, config, "visionary", "visionary_chain")
+
+
+def finance_node(state: PitchState, config: RunnableConfig) -> PitchState:
+    return _run_persona(state, config, "finance_shark", "finance_chain")
+
+
+def customer_node(state: PitchState, config: RunnableConfig) -> PitchState:
+    return _run_persona(state, config, "customer_advocate", "customer_chain")
+
+
+def skeptic_node(state: PitchState, config: RunnableConfig) -> PitchState:
+    return _run_persona(state, config, "skeptic", "skeptic_chain")
 
 
 # ================== PANEL AGGREGATOR MODEL & CHAIN ==================
@@ -235,16 +237,14 @@ class PanelOutput(BaseModel):
     final_recommendation: Literal["Invest", "Not Invest", "Need More Info"]
 
 
-panel_parser = PydanticOutputParser(pydantic_object=PanelOutput)
+panel_parser = TolerantPydanticOutputParser(pydantic_object=PanelOutput)
 panel_format_instructions = panel_parser.get_format_instructions()
 
 panel_prompt = ChatPromptTemplate.from_messages([
     ("system",
      "You are the moderator of a Shark Tank-style investor panel.\n"
      "You will receive:\n"
-     "- The full pitch transcript\n"
-     "- Tone scores\n"
-     "- Content/viability analysis\n"
+     "- A score summary (content dimensions, structure, viability, delivery)\n"
      "- Individual feedback + decisions from four sharks:\n"
      "  * The Visionary\n"
      "  * The Finance Shark\n"
@@ -262,9 +262,7 @@ panel_prompt = ChatPromptTemplate.from_messages([
      "You MUST return a single JSON object with this schema:\n"
      "{format_instructions}"),
     ("user",
-     "TRANSCRIPT:\n{transcript}\n\n"
-     "TONE_SCORES (JSON):\n{tone_scores}\n\n"
-     "ANALYSIS (JSON):\n{analysis}\n\n"
+     "SCORE_SUMMARY (JSON):\n{score_summary}\n\n"
      "VISIONARY_FEEDBACK:\n{visionary_feedback}\nDecision: {visionary_decision}\n\n"
      "FINANCE_SHARK_FEEDBACK:\n{finance_shark_feedback}\nDecision: {finance_shark_decision}\n\n"
      "CUSTOMER_ADVOCATE_FEEDBACK:\n{customer_advocate_feedback}\nDecision: {customer_advocate_decision}\n\n"
@@ -272,18 +270,46 @@ panel_prompt = ChatPromptTemplate.from_messages([
      "Now produce the combined panel-style feedback and the final panel recommendation."),
 ])
 
-panel_chain = (
-    panel_prompt.partial(format_instructions=panel_format_instructions)
-    | llm
-    | panel_parser
-)
+
+# ================== CHAINS (built on first use) ==================
+@lru_cache(maxsize=None)
+def _build_agent_chains(backend: str, json_mode: bool) -> Dict[str, Runnable]:
+    llm = get_llm(temperature=0.3)
+
+    chains = {"llm": llm}
+    for chain_name, (persona_name, persona_focus) in PERSONAS.items():
+        chains[chain_name] = structured_chain(
+            persona_prompt.partial(
+                persona_name=persona_name,
+                persona_focus=persona_focus,
+                format_instructions=persona_format_instructions,
+            ),
+            persona_parser,
+            temperature=0.3,
+            json_mode=json_mode,
+        )
+    chains["panel_chain"] = structured_chain(
+        panel_prompt.partial(format_instructions=panel_format_instructions),
+        panel_parser,
+        temperature=0.3,
+        json_mode=json_mode,
+    )
+    return chains
 
 
-def panel_node(state: PitchState) -> PitchState:
-    res = panel_chain.invoke({
-        "transcript": state["transcript"],
-        "tone_scores": json.dumps(state["tone_scores"], ensure_ascii=False),
-        "analysis": json.dumps(state["analysis"], ensure_ascii=False),
+def get_agent_chains(json_mode: bool = True) -> Dict[str, Runnable]:
+    """Build the persona and panel chains on first use, on the shared client from `llm.get_llm`.
+
+    `json_mode=False` gives the variant used when feedback is streamed (Groq
+    does not stream JSON-mode replies). The JSON-mode chains are also
+    reachable as module attributes (`agents.visionary_chain`, ...).
+    """
+    return _build_agent_chains(current_backend(), json_mode)
+
+
+def panel_node(state: PitchState, config: RunnableConfig) -> PitchState:
+    res = _chains(config)["panel_chain"].invoke({
+        "score_summary": state["panel_context"],
         "visionary_feedback": state.get("visionary_feedback", ""),
         "visionary_decision": state.get("visionary_decision", ""),
         "finance_shark_feedback": state.get("finance_shark_feedback", ""),
@@ -300,8 +326,8 @@ def panel_node(state: PitchState) -> PitchState:
 
 
 # ================== LANGGRAPH DEFINITION ==================
-def build_shark_panel_graph():
-    """Build and compile the shark panel graph."""
+def build_shark_panel_graph(checkpointer=None):
+    """Build and compile the shark panel graph (optionally with a checkpointer)."""
     graph = StateGraph(PitchState)
 
     # Add nodes
@@ -311,49 +337,263 @@ def build_shark_panel_graph():
     graph.add_node("skeptic", skeptic_node)
     graph.add_node("panel", panel_node)
 
-    # Entry node
-    def start_node(state: PitchState) -> PitchState:
-        return state
-
-    graph.add_node("start", start_node)
+    # Entry node: builds the per-persona context once
+    graph.add_node("start", context_node)
     graph.set_entry_point("start")
 
-    # Edges: Sequential execution to avoid rate limits (start → visionary → finance → customer → skeptic → panel)
-    graph.add_edge("start", "visionary")
-    graph.add_edge("visionary", "finance_shark")
-    graph.add_edge("finance_shark", "customer_advocate")
-    graph.add_edge("customer_advocate", "skeptic")
-    graph.add_edge("skeptic", "panel")
+    # Edges: the four sharks fan out in parallel and join at the panel
+    # (rate limits are enforced by the shared limiter in `rate_limit`)
+    sharks = ["visionary", "finance_shark", "customer_advocate", "skeptic"]
+    for shark in sharks:
+        graph.add_edge("start", shark)
+    graph.add_edge(sharks, "panel")
 
     # Panel → END
     graph.add_edge("panel", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
+
+# Checkpoints of runs that never finished are dropped after this many seconds
+CHECKPOINT_TTL_SEC = float(os.getenv("SHARK_CHECKPOINT_TTL_SEC", str(24 * 3600)))
+# ...and looked for at most this often (pruning reads every stored checkpoint)
+CHECKPOINT_PRUNE_INTERVAL_SEC = 3600.0
+
+_last_prune = float("-inf")
+_PRUNE_LOCK = threading.Lock()
+
+# One lock per checkpoint thread, so concurrent runs with the same inputs take turns
+_RUN_LOCKS: Dict[str, list] = {}
+_RUN_LOCKS_GUARD = threading.Lock()
+
+
+def _build_checkpointer():
+    """SQLite checkpoints on local disk (langgraph-checkpoint-sqlite), or in memory if it is missing.
+
+    Configuration (environment):
+      SHARK_CHECKPOINT_PATH     SQLite file (default: .cache/shark_checkpoints.sqlite)
+      SHARK_CHECKPOINT_TTL_SEC  lifetime of unfinished runs (default: 1 day)
+    """
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        logger.warning("langgraph-checkpoint-sqlite is not installed; shark panel checkpoints are kept "
+                       "in memory and do not survive a restart")
+        return InMemorySaver()
+
+    path = os.getenv("SHARK_CHECKPOINT_PATH", os.path.join(".cache", "shark_checkpoints.sqlite"))
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+
+def prune_checkpoints(checkpointer, ttl_sec: float = None) -> int:
+    """Delete runs whose latest checkpoint is older than `ttl_sec`; returns how many were dropped.
+
+    Finished runs are deleted as soon as they return, so only interrupted
+    runs that were never retried accumulate here. `run_shark_panel` calls
+    this at most once per CHECKPOINT_PRUNE_INTERVAL_SEC.
+    """
+    ttl_sec = CHECKPOINT_TTL_SEC if ttl_sec is None else ttl_sec
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_sec)
+    latest: Dict[str, datetime] = {}
+    for item in checkpointer.list(None):
+        thread_id = item.config["configurable"]["thread_id"]
+        ts = datetime.fromisoformat(item.checkpoint["ts"])
+        latest[thread_id] = max(ts, latest.get(thread_id, ts))
+    stale = [thread_id for thread_id, ts in latest.items() if ts < cutoff]
+    for thread_id in stale:
+        checkpointer.delete_thread(thread_id)
+    if stale:
+        logger.info("Dropped %d stale shark panel checkpoint(s)", len(stale))
+    return len(stale)
+
+
+def _maybe_prune(checkpointer) -> None:
+    """`prune_checkpoints` at most once per CHECKPOINT_PRUNE_INTERVAL_SEC per process."""
+    global _last_prune
+    with _PRUNE_LOCK:
+        now = time.monotonic()
+        if now - _last_prune < CHECKPOINT_PRUNE_INTERVAL_SEC:
+            return
+        _last_prune = now
+    prune_checkpoints(checkpointer)
+
+
+@contextmanager
+def _run_lock(thread_id: str):
+    """Hold the lock of checkpoint thread `thread_id` (created on demand, dropped when unused)."""
+    with _RUN_LOCKS_GUARD:
+        entry = _RUN_LOCKS.setdefault(thread_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _RUN_LOCKS_GUARD:
+            entry[1] -= 1
+            if not entry[1]:
+                del _RUN_LOCKS[thread_id]
+
+
+@lru_cache(maxsize=None)
+def get_shark_panel_app():
+    """The compiled, checkpointed shark panel graph, built on first use."""
+    return build_shark_panel_graph(checkpointer=_build_checkpointer())
+
+
+def __getattr__(name: str):
+    if name == "shark_panel_app":
+        return get_shark_panel_app()
+    if name == "llm" or name in PERSONAS or name == "panel_chain":
+        return get_agent_chains()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Field streamed as text to the UI for each node
+_STREAMED_FIELD = {
+    "visionary": "feedback",
+    "finance_shark": "feedback",
+    "customer_advocate": "feedback",
+    "skeptic": "feedback",
+    "panel": "combined_feedback",
+}
+
+# callback(stage, payload), same signature as the pipeline callback
+PanelCallback = Callable[[str, Dict], None]
+
+
+class _FeedbackStream:
+    """Turns streamed JSON token chunks into feedback-text events.
+
+    Each LLM reply (keyed by node and message id, so a repair call starts a
+    fresh buffer) is re-parsed as partial JSON and the growth of its feedback
+    field is reported as `sharks.token` with the delta and the text so far.
+    """
 
+    def __init__(self, on_event: PanelCallback):
+        self.on_event = on_event
+        self._buffers: Dict[tuple, str] = {}
+        self._emitted: Dict[tuple, int] = {}
+
+    def token(self, chunk, metadata: Dict) -> None:
+        node = metadata.get("langgraph_node")
+        field = _STREAMED_FIELD.get(node)
+        if field is None or not isinstance(chunk.content, str) or not chunk.content:
+            return
+        key = (node, chunk.id)
+        self._buffers[key] = self._buffers.get(key, "") + chunk.content
+        try:
+            partial = parse_partial_json(self._buffers[key])
+        except ValueError:
+            partial = None
+        text = partial.get(field) if isinstance(partial, dict) else None
+        if not isinstance(text, str) or len(text) <= self._emitted.get(key, 0):
+            return
+        delta = text[self._emitted.get(key, 0):]
+        self._emitted[key] = len(text)
+        self.on_event("sharks.token", {"node": node, "delta": delta, "text": text})
+
+    def update(self, updates: Dict) -> None:
+        for node, values in updates.items():
+            if values and node in _STREAMED_FIELD:
+                self.on_event("sharks.node", dict(values, node=node))
+
+
+def _initial_state(transcript: str, tone_scores: Dict, analysis: Dict) -> PitchState:
+    return {
+        "transcript": transcript,
+        "tone_scores": tone_scores,
+        "analysis": analysis,
+    }
 
-# Build the compiled app
-shark_panel_app = build_shark_panel_graph()
 
+def _resume_plan(app, config: Dict, initial_state: PitchState):
+    """Return the graph input for the run identified by `config`.
 
-def run_shark_panel(transcript: str, tone_scores: Dict, analysis: Dict) -> Dict:
+    An interrupted run resumes from its last checkpoint (input None),
+    re-running only the nodes that did not complete. A new run, or a
+    finished one whose checkpoint was left behind, starts from `initial_state`.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    snapshot = app.get_state(config)
+    if not snapshot.values:
+        return initial_state
+    if snapshot.next:
+        logger.info("Resuming shark panel run %s at %s", thread_id, list(snapshot.next))
+        return None
+    app.checkpointer.delete_thread(thread_id)
+    return initial_state
+
+
+def run_shark_panel(transcript: str, tone_scores: Dict, analysis: Dict,
+                    on_event: Optional[PanelCallback] = None, run_id: Optional[str] = None) -> Dict:
     """Run the shark panel evaluation.
     
     Args:
         transcript: Full pitch transcript
         tone_scores: Tone analysis results
         analysis: Content analysis results
+        on_event: Optional `callback(stage, payload)`. When given, the graph is
+            streamed: each shark's (and the panel's) feedback text is reported
+            as it is generated (`sharks.token` with node, delta and text so far)
+            and each finished node as `sharks.node` with its state update.
+            Events are delivered on the calling thread. Streamed runs call
+            the model without JSON mode, which Groq cannot stream.
+        run_id: Checkpoint key for this run. Defaults to a hash of the inputs,
+            so calling again with the same inputs after a failure resumes from
+            the last completed node instead of paying for the sharks again.
+            The checkpoint is deleted once the run finishes, so a later call
+            always evaluates afresh; unfinished runs expire after
+            SHARK_CHECKPOINT_TTL_SEC.
         
     Returns:
         Dict with individual shark feedback and panel decision
     """
-    initial_state: PitchState = {
-        "transcript": transcript,
-        "tone_scores": tone_scores,
-        "analysis": analysis,
-    }
-    
-    result = shark_panel_app.invoke(initial_state)
+    initial_state = _initial_state(transcript, tone_scores, analysis)
+    app = get_shark_panel_app()
+    _maybe_prune(app.checkpointer)
+    thread_id = run_id or make_key("shark_panel", **initial_state)
+    # streamed runs use the non-JSON-mode chains (see `_chains`)
+    config = {"configurable": {"thread_id": thread_id, "stream_tokens": on_event is not None}}
+
+    # runs sharing a thread (e.g. the same video uploaded twice) take turns, so
+    # one never deletes the checkpoint another is still writing
+    with _run_lock(thread_id):
+        graph_input = _resume_plan(app, config, initial_state)
+        if on_event is None:
+            result = app.invoke(graph_input, config)
+        else:
+            stream = _FeedbackStream(on_event)
+            result = {}
+            for mode, chunk in app.stream(graph_input, config, stream_mode=["messages", "updates", "values"]):
+                if mode == "messages":
+                    stream.token(*chunk)
+                elif mode == "updates":
+                    stream.update(chunk)
+                else:
+                    result = chunk
+        app.checkpointer.delete_thread(thread_id)
+
+    if not result or "panel_final_recommendation" not in result:
+        raise RuntimeError(f"Shark panel run {thread_id} finished without a panel recommendation")
     return result
 
 
-__all__ = ["run_shark_panel", "shark_panel_app", "PitchState"]
+async def arun_shark_panel(transcript: str, tone_scores: Dict, analysis: Dict,
+                           on_event: Optional[PanelCallback] = None, run_id: Optional[str] = None) -> Dict:
+    """Async version of `run_shark_panel`.
+
+    The persona nodes are synchronous and the on-disk checkpointer is sync-only,
+    so the run is delegated to a worker thread; `on_event`, if given, is called
+    from that thread.
+    """
+    return await asyncio.to_thread(run_shark_panel, transcript, tone_scores, analysis, on_event, run_id)
+
+
+__all__ = [
+    "run_shark_panel", "arun_shark_panel", "shark_panel_app", "get_shark_panel_app",
+    "prune_checkpoints", "PitchState",
+]
@@ -1,7 +1,7 @@
 """Streamlit front-end for Pitch Evaluation.
 
 Features:
-- Upload a video (max 3 minutes). Audio extraction trims to 3 minutes.
+- Upload a video or an audio recording (max 3 minutes). Audio extraction trims to 3 minutes.
 - Shows live progress updates for each pipeline stage.
 - Displays transcript, enhanced tone metrics, content analysis, and full shark panel feedback.
 
@@ -74,8 +74,8 @@ st.markdown("""
 st.markdown('<div class="main-header">🦈 Pitch Evaluation Studio</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">Upload your pitch video and get AI-powered feedback from our virtual Shark Tank panel</div>', unsafe_allow_html=True)
 
-uploaded = st.file_uploader("📹 Upload your pitch video (MP4, MOV, MKV, AVI - max 3 minutes)", 
-                            type=["mp4", "mov", "mkv", "avi"], 
+uploaded = st.file_uploader("📹 Upload your pitch video or audio (MP4, MOV, MKV, AVI, WAV, MP3, M4A, OGG - max 3 minutes)", 
+                            type=["mp4", "mov", "mkv", "avi", "wav", "mp3", "m4a", "ogg"], 
                             accept_multiple_files=False)
 
 # Progress tracking
@@ -84,9 +84,79 @@ if 'progress_messages' not in st.session_state:
 
 progress_placeholder = st.empty()
 status_placeholder = st.empty()
+live_transcript_placeholder = st.empty()
+live_scores_placeholder = st.empty()
+live_sharks_placeholder = st.empty()
+
+DIMENSION_LABELS = {
+    "problem_clarity": "💡 Problem Clarity",
+    "product_differentiation": "🎯 Product Differentiation",
+    "business_model_strength": "💰 Business Model",
+    "market_opportunity": "📈 Market Opportunity",
+    "revenue_logic": "💵 Revenue Logic",
+    "competition_awareness": "🏢 Competition Awareness",
+    "pitch_structure": "🏗️ Pitch Structure",
+}
+
+SHARK_LABELS = {
+    "visionary": "🔮 The Visionary",
+    "finance_shark": "💰 The Finance Shark",
+    "customer_advocate": "❤️ The Customer Advocate",
+    "skeptic": "🤔 The Skeptic",
+    "panel": "🦈 Panel",
+}
+
+
+def render_live_sharks():
+    with live_sharks_placeholder.container():
+        st.markdown("### 🦈 Shark Panel (live)")
+        for node, label in SHARK_LABELS.items():
+            entry = st.session_state.live_sharks.get(node)
+            if entry is None:
+                continue
+            text, decision = entry
+            st.markdown(f"**{label}**" + (f" — {decision}" if decision else " ✍️"))
+            st.caption(text)
 
 def ui_callback(stage, payload):
     """Called from pipeline to update the UI with beautiful progress."""
+    # Live transcript: append each segment as it is decoded
+    if stage == "transcribe.segment":
+        st.session_state.live_transcript += payload.get("text", "")
+        with live_transcript_placeholder.container():
+            st.markdown("### 📝 Live Transcript")
+            st.caption(st.session_state.live_transcript.strip())
+        return
+
+    # Live content scores: show each dimension as soon as its chain finishes
+    if stage == "content.dimension":
+        result = payload.get("result", {})
+        score = result.get("score", result.get("structure_quality_score", 0))
+        comment = result.get("reason", result.get("structure_comment", ""))
+        st.session_state.live_scores[payload.get("name")] = (score, comment)
+        with live_scores_placeholder.container():
+            st.markdown("### 📊 Content Scores (live)")
+            cols = st.columns(4)
+            for i, (name, (score, comment)) in enumerate(st.session_state.live_scores.items()):
+                with cols[i % 4]:
+                    st.metric(DIMENSION_LABELS.get(name, name), f"{score}/100")
+                    st.caption(comment)
+        return
+
+    # Live shark feedback: render each shark's words as they are generated
+    if stage == "sharks.token":
+        st.session_state.live_sharks[payload["node"]] = (payload.get("text", ""), None)
+        render_live_sharks()
+        return
+    if stage == "sharks.node":
+        node = payload["node"]
+        field = "combined_feedback" if node == "panel" else "feedback"
+        text = payload.get(f"{node}_{field}", st.session_state.live_sharks.get(node, ("", None))[0])
+        decision = payload.get(f"{node}_decision", payload.get("panel_final_recommendation"))
+        st.session_state.live_sharks[node] = (text, decision)
+        render_live_sharks()
+        return
+
     # Create user-friendly messages
     stage_icons = {
         "start": "🚀",
@@ -143,6 +213,9 @@ if uploaded:
     if 'last_processed_file' not in st.session_state or st.session_state.last_processed_file != file_id:
         # Reset progress messages
         st.session_state.progress_messages = []
+        st.session_state.live_transcript = ""
+        st.session_state.live_scores = {}
+        st.session_state.live_sharks = {}
         
         # Save to a temp file
         t = tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded.name).suffix)
@@ -154,6 +227,9 @@ if uploaded:
         
         with st.spinner("🔄 Processing your pitch..."):
             results = run_pipeline(t.name, callback=ui_callback)
+        live_transcript_placeholder.empty()
+        live_scores_placeholder.empty()
+        live_sharks_placeholder.empty()
         
         # Store results in session state
         st.session_state.results = results
@@ -187,7 +263,7 @@ if uploaded:
         col1.metric("🎯 Confidence", f"{tone.get('confidence_score', 0):.0f}/100")
         col2.metric("✨ Expressiveness", f"{tone.get('expressiveness_score', 0):.0f}/100")
         col3.metric("🎭 Overall Delivery", f"{tone.get('delivery_score', 0):.0f}/100")
-        col4.metric("⚡ Speaking Rate", f"{tone.get('speaking_rate', 0):.0f} BPM")
+        col4.metric("⚡ Speaking Rate", f"{tone.get('speaking_rate', 0):.0f} syll/min")
         
         st.subheader("Detailed Metrics")
         col5, col6, col7, col8 = st.columns(4)
@@ -1,6 +1,40 @@
 import os
+import shutil
+import subprocess
 import tempfile
-from moviepy.editor import VideoFileClip
+from typing import Iterator
+import numpy as np
+import soundfile as sf
+from moviepy.config import get_setting
+from moviepy.editor import AudioFileClip, VideoFileClip
+
+from cache import artifact_cache, file_digest, make_key
+
+SAMPLE_RATE = 16000
+
+# Uploads with these extensions are treated as plain audio: no video container handling.
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg")
+
+
+def is_audio_file(path: str) -> bool:
+    """True if `path` is an audio-only upload (by extension)."""
+    return os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS
+
+
+def is_pcm16k_mono_wav(path: str) -> bool:
+    """True if `path` is already a 16 kHz mono PCM WAV, i.e. needs no re-encoding."""
+    if os.path.splitext(path)[1].lower() != ".wav":
+        return False
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        return False
+    return (
+        info.format == "WAV"
+        and info.subtype == "PCM_16"
+        and info.samplerate == SAMPLE_RATE
+        and info.channels == 1
+    )
 
 
 def extract_audio_from_video(video_path: str, out_wav: str, max_duration_sec: int = None):
@@ -8,17 +42,25 @@ def extract_audio_from_video(video_path: str, out_wav: str, max_duration_sec: in
 
     - Trims to `max_duration_sec` seconds if specified and the video is longer.
     - Ensures sample rate 16k using moviepy's write_audiofile parameters.
+    - Audio-only inputs skip the video container; 16k mono PCM WAVs are copied as-is.
     """
     if not os.path.exists(video_path):
         raise FileNotFoundError(video_path)
 
-    with VideoFileClip(video_path) as clip:
+    if is_pcm16k_mono_wav(video_path):
+        if not max_duration_sec or sf.info(video_path).duration <= max_duration_sec:
+            shutil.copyfile(video_path, out_wav)
+            return out_wav
+
+    clip_cls = AudioFileClip if is_audio_file(video_path) else VideoFileClip
+    with clip_cls(video_path) as clip:
         duration = clip.duration
         if max_duration_sec and duration > max_duration_sec:
             clip = clip.subclip(0, max_duration_sec)
 
+        audio_clip = clip if clip_cls is AudioFileClip else clip.audio
         # moviepy handles conversion; ensure ffmpeg is available on PATH
-        clip.audio.write_audiofile(
+        audio_clip.write_audiofile(
             out_wav,
             fps=16000,
             nbytes=2,
@@ -30,10 +72,133 @@ def extract_audio_from_video(video_path: str, out_wav: str, max_duration_sec: in
     return out_wav
 
 
+def _ffmpeg_decode_cmd(media_path: str, max_duration_sec: int = None, sr: int = SAMPLE_RATE) -> list:
+    cmd = [get_setting("FFMPEG_BINARY"), "-nostdin", "-v", "error", "-i", media_path]
+    if max_duration_sec:
+        cmd += ["-t", str(max_duration_sec)]
+    cmd += ["-vn", "-ac", "1", "-ar", str(sr), "-f", "f32le", "-"]
+    return cmd
+
+
+def audio_cache_key(media_path: str, max_duration_sec: int = None, sr: int = SAMPLE_RATE) -> str:
+    """Cache key of the decoded audio for `media_path` (content hash + decode params)."""
+    return make_key(file_digest(media_path), kind="audio", max_duration_sec=max_duration_sec, sr=sr)
+
+
+def load_audio(media_path: str, max_duration_sec: int = None, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode the audio track of `media_path` straight into memory.
+
+    ffmpeg downmixes to mono, resamples to `sr` and writes float32 samples to
+    a pipe, so no intermediate WAV is written. The returned buffer can be passed
+    directly to `transcribe_audio` and `analyze_tone`.
+
+    16k mono PCM WAVs are read directly without starting ffmpeg; other inputs
+    are looked up in the artifact cache before decoding.
+    """
+    if not os.path.exists(media_path):
+        raise FileNotFoundError(media_path)
+
+    if sr == SAMPLE_RATE and is_pcm16k_mono_wav(media_path):
+        frames = int(max_duration_sec * sr) if max_duration_sec else -1
+        return sf.read(media_path, frames=frames, dtype="float32")[0]
+
+    key = audio_cache_key(media_path, max_duration_sec, sr) if artifact_cache.enabled else None
+    if key:
+        cached = artifact_cache.get_array(key)
+        if cached is not None:
+            return cached
+
+    cmd = _ffmpeg_decode_cmd(media_path, max_duration_sec, sr)
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {media_path}: {proc.stderr.decode(errors='replace').strip()}")
+    audio = np.frombuffer(proc.stdout, dtype=np.float32)
+
+    if key:
+        artifact_cache.put_array(key, audio)
+    return audio
+
+
+def iter_audio_chunks(
+    media_path: str,
+    chunk_sec: float = 10.0,
+    max_duration_sec: int = None,
+    sr: int = SAMPLE_RATE,
+) -> Iterator[np.ndarray]:
+    """Stream the audio track of `media_path` as fixed-size float32 chunks.
+
+    Chunks of `chunk_sec` seconds (the last one may be shorter) are yielded as
+    soon as ffmpeg has demuxed and decoded them, so consumers can start
+    working before the whole file has been read.
+
+    Decoded audio is served from and written to the same artifact cache entry
+    as `load_audio`; it is only written when the stream was read to the end.
+    """
+    if not os.path.exists(media_path):
+        raise FileNotFoundError(media_path)
+
+    if sr == SAMPLE_RATE and is_pcm16k_mono_wav(media_path):
+        frames = int(max_duration_sec * sr) if max_duration_sec else -1
+        yield from sf.blocks(media_path, blocksize=int(chunk_sec * sr), frames=frames, dtype="float32")
+        return
+
+    key = audio_cache_key(media_path, max_duration_sec, sr) if artifact_cache.enabled else None
+    cached = artifact_cache.get_array(key) if key else None
+    if cached is not None:
+        step = int(chunk_sec * sr)
+        for start in range(0, len(cached), step):
+            yield cached[start:start + step]
+        return
+
+    chunk_bytes = int(chunk_sec * sr) * 4  # float32
+    # decoded samples are spooled to a temp file (not kept in memory) and
+    # stored in the audio cache once the whole file has been decoded
+    spool = tempfile.TemporaryFile() if key else None
+    proc = subprocess.Popen(
+        _ffmpeg_decode_cmd(media_path, max_duration_sec, sr),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    finished = False
+    try:
+        while True:
+            buf = proc.stdout.read(chunk_bytes)
+            if not buf:
+                finished = True
+                break
+            if spool:
+                spool.write(buf)
+            yield np.frombuffer(buf, dtype=np.float32)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read()
+        proc.stderr.close()
+        returncode = proc.wait()
+        if spool and not (finished and returncode == 0):
+            spool.close()  # stopped early or failed: nothing to cache
+            spool = None
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {media_path}: {stderr.decode(errors='replace').strip()}")
+    if spool:
+        with spool:
+            spool.flush()
+            if spool.tell():
+                artifact_cache.put_array(key, np.memmap(spool, dtype=np.float32, mode="r"))
+
+
 def make_temp_wav_path(prefix: str = "pitch_") -> str:
     fd, path = tempfile.mkstemp(prefix=prefix, suffix=".wav")
     os.close(fd)
     return path
 
 
-__all__ = ["extract_audio_from_video", "make_temp_wav_path"]
+__all__ = [
+    "AUDIO_EXTENSIONS",
+    "is_audio_file",
+    "is_pcm16k_mono_wav",
+    "audio_cache_key",
+    "extract_audio_from_video",
+    "load_audio",
+    "iter_audio_chunks",
+    "make_temp_wav_path",
+]
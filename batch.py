@@ -0,0 +1,211 @@
+"""Batch/cohort runner: grade a folder (or manifest) of pitches from the command line.
+
+CPU stages (audio extraction, whisper transcription, tone analysis) run in a
+bounded pool of spawned worker processes; LLM stages (condensation, content
+analysis, shark panel) run concurrently on one asyncio loop, where the shared
+limiters in `rate_limit` cap in-flight requests and requests/tokens per minute
+across all pitches. Each result is appended to a JSONL file as soon as its
+pitch finishes, and pitches already recorded as "ok" there are skipped, so an
+interrupted run resumes where it stopped.
+
+Usage:
+  python batch.py videos/ --out results.jsonl --workers 4
+  python batch.py cohort.jsonl --out results.jsonl --scoring-mode consolidated
+
+A manifest is either a .jsonl file with one {"path": ..., "id": ...} object per
+line ("id" defaults to the path) or a text file with one path per line
+(blank lines and # comments are ignored). Relative paths are resolved against
+the manifest's directory. Files found in a directory are identified by their
+path relative to it. --no-resume truncates the output file first.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Set
+
+from logging_config import get_logger
+from cache import artifact_cache
+from audio import AUDIO_EXTENSIONS, audio_cache_key, load_audio
+from transcribe import transcribe_audio
+from tone import analyze_tone_windowed
+from main import acondense_transcript, analyze_pitch_with_viability_async
+from agents import arun_shark_panel
+from pipeline import compact_timeline, segment_tone_metrics
+from rate_limit import llm_limiter
+
+logger = get_logger(__name__)
+
+MEDIA_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi") + tuple(AUDIO_EXTENSIONS)
+
+
+# ================== INPUTS ==================
+def load_items(source: str) -> List[Dict[str, str]]:
+    """Return [{'id', 'path'}, ...] from a media directory or a manifest file."""
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(MEDIA_EXTENSIONS)
+        )
+        # ids are relative to `source`, so resume matches however it is spelled
+        return [{"id": os.path.relpath(path, source), "path": path} for path in paths]
+
+    base = os.path.dirname(os.path.abspath(source))
+    items = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line) if source.endswith(".jsonl") else {"path": line}
+            path = entry["path"] if os.path.isabs(entry["path"]) else os.path.join(base, entry["path"])
+            items.append({"id": str(entry.get("id", entry["path"])), "path": path})
+    return items
+
+
+def completed_ids(out_path: str) -> Set[str]:
+    """Ids already recorded as "ok" in `out_path` (a partial last line is ignored)."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+# ================== STAGES ==================
+def cpu_stage(path: str, cpu_threads: int = 0) -> Dict:
+    """Extraction, transcription and tone analysis for one pitch (runs in a worker process).
+
+    `cpu_threads` is whisper's intra-op thread count, so the workers together
+    do not oversubscribe the cores.
+    """
+    t0 = time.perf_counter()
+    audio = load_audio(path, max_duration_sec=None)
+    source_key = audio_cache_key(path) if artifact_cache.enabled else None
+    transcript, segments = transcribe_audio(audio, source_key=source_key, cpu_threads=cpu_threads)
+    tone_acc = analyze_tone_windowed(audio)
+    return {
+        "transcript": transcript,
+        "segments": segments,
+        "tone_scores": tone_acc.result(),
+        "tone_segments": segment_tone_metrics(segments, tone_acc),
+        "cpu_sec": round(time.perf_counter() - t0, 2),
+    }
+
+
+async def llm_stages(cpu: Dict, scoring_mode: str) -> Dict:
+    """Condensation, content analysis and shark panel for one pitch, on the event loop."""
+    t0 = time.perf_counter()
+    content_transcript = await acondense_transcript(cpu["transcript"], cpu["segments"])
+    analysis = await analyze_pitch_with_viability_async(content_transcript, scoring_mode=scoring_mode)
+    panel = await arun_shark_panel(
+        transcript=content_transcript,
+        tone_scores=dict(cpu["tone_scores"], segment_timeline=compact_timeline(cpu["tone_segments"])),
+        analysis=analysis,
+    )
+    return {
+        "analysis": analysis,
+        # feedback and decisions only; the panel state also echoes its inputs
+        "shark_panel": {k: v for k, v in panel.items() if k.endswith(("_feedback", "_decision", "_recommendation"))},
+        "llm_sec": round(time.perf_counter() - t0, 2),
+    }
+
+
+# ================== RUNNER ==================
+async def run_batch(items: Iterable[Dict[str, str]], out_path: str, workers: int = 2,
+                    scoring_mode: str = "parallel") -> Dict[str, int]:
+    """Grade `items`, appending one JSON record per pitch to `out_path` as each finishes."""
+    items = list(items)
+    loop = asyncio.get_running_loop()
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    counts = {"ok": 0, "error": 0}
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool, open(out_path, "a", encoding="utf-8") as out:
+
+        async def grade(item: Dict[str, str]) -> Dict:
+            t0 = time.perf_counter()
+            record = {"id": item["id"], "path": item["path"]}
+            try:
+                cpu = await loop.run_in_executor(pool, cpu_stage, item["path"], cpu_threads)
+                llm = await llm_stages(cpu, scoring_mode)
+                record.update(
+                    status="ok",
+                    transcript=cpu["transcript"],
+                    tone_scores=cpu["tone_scores"],
+                    analysis=llm["analysis"],
+                    shark_panel=llm["shark_panel"],
+                    timings={"cpu_sec": cpu["cpu_sec"], "llm_sec": llm["llm_sec"]},
+                )
+            except Exception as e:
+                logger.exception("Failed to grade %s", item["path"])
+                record.update(status="error", error=f"{type(e).__name__}: {e}")
+            record["elapsed_sec"] = round(time.perf_counter() - t0, 2)
+            return record
+
+        for next_done in asyncio.as_completed([grade(item) for item in items]):
+            record = await next_done
+            # single writer on the loop thread; flush so a crash loses at most this line
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            print(f"[{counts['ok'] + counts['error']}/{len(items)}] {record['status']}: {record['id']}", flush=True)
+
+    return counts
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Grade a folder or manifest of pitch videos/recordings.")
+    parser.add_argument("source", help="directory of media files, or a .jsonl/.txt manifest")
+    parser.add_argument("--out", default="results.jsonl", help="JSONL output, appended to and used for resume")
+    parser.add_argument("--workers", type=_positive_int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="processes for extraction, transcription and tone analysis")
+    parser.add_argument("--llm-concurrency", type=_positive_int, default=None,
+                        help="in-flight LLM requests across all pitches (default: LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--scoring-mode", choices=("parallel", "consolidated"), default="parallel")
+    parser.add_argument("--no-resume", action="store_true", help="regrade every pitch, overwriting --out")
+    args = parser.parse_args(argv)
+
+    items = load_items(args.source)
+    if args.no_resume:
+        open(args.out, "w").close()  # start a fresh file rather than append duplicate ids
+    else:
+        done = completed_ids(args.out)
+        if done:
+            print(f"Resuming: {len(done)} pitches already graded in {args.out}")
+        items = [item for item in items if item["id"] not in done]
+    if not items:
+        print("Nothing to grade.")
+        return 0
+
+    if args.llm_concurrency:
+        llm_limiter.limit = args.llm_concurrency  # set before any request is made
+
+    counts = asyncio.run(run_batch(items, args.out, args.workers, args.scoring_mode))
+    print(f"Done: {counts['ok']} ok, {counts['error']} failed -> {args.out}")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Content-addressed on-disk cache for decoded audio and transcripts.
+
+Entries are keyed by a streaming SHA-256 of the input file plus the
+parameters used to produce them, so re-scoring an unchanged upload skips
+extraction and transcription entirely. The cache is size-capped and evicts
+least-recently-used entries (access time is tracked through file mtimes).
+
+Configuration (environment):
+  PITCH_CACHE_DIR     cache directory (default: .cache/artifacts)
+  PITCH_CACHE_MAX_MB  size cap in MB (default: 2048, 0 disables the cache)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Optional
+
+import numpy as np
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_DIGEST_MEMO = {}
+_DIGEST_LOCK = threading.Lock()
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file contents, read in `chunk_size` blocks.
+
+    Results are memoized per (path, size, mtime) so a file is hashed once
+    per process even if several stages ask for it.
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _DIGEST_LOCK:
+        if memo_key in _DIGEST_MEMO:
+            return _DIGEST_MEMO[memo_key]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    digest = h.hexdigest()
+
+    with _DIGEST_LOCK:
+        _DIGEST_MEMO[memo_key] = digest
+    return digest
+
+
+def make_key(source: str, **params) -> str:
+    """Cache key for an artifact derived from `source` (a digest or another key) with `params`."""
+    payload = json.dumps({"source": source, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """Size-bounded LRU cache of NumPy arrays and JSON documents on local disk."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # running estimate of the cache size; None until the first scan
+        self._size: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def _read(self, key: str, ext: str, loader) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        path = self._path(key, ext)
+        try:
+            value = loader(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def _write(self, key: str, ext: str, writer) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file and rename so readers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer(f)
+            added = os.path.getsize(tmp)
+            try:
+                added -= os.path.getsize(path)  # overwriting an existing entry
+            except OSError:
+                pass
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._account(added)
+
+    def get_array(self, key: str) -> Optional[np.ndarray]:
+        return self._read(key, ".npy", lambda p: np.load(p, allow_pickle=False))
+
+    def put_array(self, key: str, value: np.ndarray) -> None:
+        self._write(key, ".npy", lambda f: np.save(f, value, allow_pickle=False))
+
+    def get_json(self, key: str) -> Optional[Any]:
+        def load(p):
+            with open(p, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return self._read(key, ".json", load)
+
+    def put_json(self, key: str, value: Any) -> None:
+        self._write(key, ".json", lambda f: f.write(json.dumps(value, ensure_ascii=False).encode("utf-8")))
+
+    def _account(self, added: int) -> None:
+        """Add a write to the size estimate and evict only once it exceeds `max_bytes`.
+
+        The directory is scanned on the first write and whenever the estimate
+        crosses the cap, not on every write. Other processes sharing the
+        directory are picked up by those scans.
+        """
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+                if self._size <= self.max_bytes:
+                    return
+            self._size = self._evict()
+
+    def _evict(self) -> int:
+        """Delete least-recently-used entries until the cache fits in `max_bytes`; returns the new size."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.info("Evicted cache entry %s", path)
+            except OSError:
+                pass
+        return total
+
+
+artifact_cache = ArtifactCache(
+    root=os.getenv("PITCH_CACHE_DIR", os.path.join(".cache", "artifacts")),
+    max_bytes=int(os.getenv("PITCH_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+)
+
+
+__all__ = ["ArtifactCache", "artifact_cache", "file_digest", "make_key"]
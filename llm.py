@@ -0,0 +1,291 @@
+"""Shared, lazily constructed chat model clients for `main.py` and `agents.py`.
+
+Nothing is built at import time: the first `get_llm(temperature)` call
+constructs the client for the configured backend, wraps it in the shared
+rate limiters (provider backends only; LLM cache hits bypass them) and
+memoizes it, so importing the pipeline neither pays for the provider SDK nor
+needs an API key.
+
+Backends:
+  groq  ChatGroq (default). Set PITCH_LLM_BASE_URL to point it at any
+        OpenAI-compatible server, e.g. a local stub for load tests.
+  fake  `FakeSchemaChatModel`, an in-process deterministic model that
+        answers with schema-valid JSON; no network, no tokens.
+
+`structured_chain` builds the `prompt | llm | parser` chains used by both
+modules: JSON mode where the provider supports it, a tolerant parser, and a
+single repair call scoped to the chain whose reply failed to parse.
+
+Configuration (environment):
+  PITCH_LLM_BACKEND   groq | fake (default: groq)
+  PITCH_LLM_MODEL     model name (default: llama-3.3-70b-versatile)
+  PITCH_LLM_BASE_URL  API base URL override for the groq backend
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from llm_cache import llm_cache
+from logging_config import get_logger
+from prompts import build_repair_prompt
+from rate_limit import limited
+
+logger = get_logger(__name__)
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+BACKENDS = ("groq", "fake")
+
+_CLIENTS: Dict[tuple, Runnable] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# PydanticOutputParser puts the JSON schema in a ``` fenced block
+_SCHEMA_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+
+class FakeSchemaChatModel(BaseChatModel):
+    """Deterministic offline chat model.
+
+    If the prompt carries a JSON schema (the format instructions of a
+    `PydanticOutputParser`), the reply is a JSON object that validates
+    against it; otherwise it echoes the head of the last message. Values are
+    derived from a hash of the prompt, so the same prompt always gets the
+    same answer and different pitches get different scores.
+    """
+
+    max_echo_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-schema"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"max_echo_words": self.max_echo_words, "stream_chunk_chars": self.stream_chunk_chars}
+
+    stream_chunk_chars: int = 8
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        schema = _find_schema(prompt)
+        if schema is not None:
+            return json.dumps(_fake_value(schema, schema, seed, "root"))
+        return " ".join(str(messages[-1].content).split()[: self.max_echo_words])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        """Yield the same reply in small chunks, like a provider token stream."""
+        text = self._reply(messages)
+        for i in range(0, len(text), self.stream_chunk_chars):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text[i:i + self.stream_chunk_chars]))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def _find_schema(prompt: str) -> Optional[dict]:
+    for block in reversed(_SCHEMA_BLOCK.findall(prompt)):
+        try:
+            schema = json.loads(block)
+        except ValueError:
+            continue
+        if isinstance(schema, dict) and "properties" in schema:
+            return schema
+    return None
+
+
+def _fake_value(node: dict, root: dict, seed: int, path: str) -> Any:
+    """Build a value matching JSON schema `node`; `path` varies the seed per field."""
+    h = int(hashlib.sha256(f"{seed}:{path}".encode()).hexdigest(), 16)
+    if "$ref" in node:
+        target = root
+        for part in node["$ref"].lstrip("#/").split("/"):
+            target = target[part]
+        return _fake_value(target, root, seed, path)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in node:
+            options = [o for o in node[key] if o.get("type") != "null"] or node[key]
+            return _fake_value(options[0], root, seed, path)
+    if "enum" in node:
+        return node["enum"][h % len(node["enum"])]
+    if "const" in node:
+        return node["const"]
+
+    kind = node.get("type", "object")
+    if kind == "object":
+        return {name: _fake_value(sub, root, seed, f"{path}.{name}")
+                for name, sub in node.get("properties", {}).items()}
+    if kind == "array":
+        items = node.get("items", {"type": "string"})
+        count = max(node.get("minItems", 0), 2)
+        return [_fake_value(items, root, seed, f"{path}[{i}]") for i in range(count)]
+    if kind in ("integer", "number"):
+        lo = node.get("minimum", 0)
+        hi = node.get("maximum", 100)
+        return int(lo + h % (int(hi - lo) + 1))
+    if kind == "boolean":
+        return bool(h % 2)
+    return f"{path.rsplit('.', 1)[-1]} ({h % 1000})"
+
+
+def _build_client(backend: str, temperature: float, json_mode: bool) -> BaseChatModel:
+    if backend == "fake":
+        return FakeSchemaChatModel()  # deterministic already; keep it out of the disk cache
+    if backend == "groq":
+        from langchain_groq import ChatGroq  # provider SDK is only imported when used
+
+        return ChatGroq(
+            model=os.getenv("PITCH_LLM_MODEL", DEFAULT_MODEL),
+            temperature=temperature,
+            api_key=os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("PITCH_LLM_BASE_URL") or None,
+            # retries go through `limited`, which shares Retry-After across callers
+            max_retries=0,
+            cache=llm_cache,
+            # JSON mode: the API guarantees a syntactically valid object
+            model_kwargs={"response_format": {"type": "json_object"}} if json_mode else {},
+        )
+    raise ValueError(f"Unknown PITCH_LLM_BACKEND {backend!r}; expected one of {BACKENDS}")
+
+
+def _cache_hit(model: BaseChatModel) -> Callable[[Any], bool]:
+    """Predicate: would `model` answer this input from `llm_cache` without a request?
+
+    Mirrors the lookup in `BaseChatModel._generate_with_cache`; any failure
+    counts as a miss, so the request is admitted normally.
+    """
+    def is_cached(input: Any) -> bool:
+        if model.cache is not llm_cache or llm_cache is None:
+            return False
+        try:
+            messages = model._convert_input(input).to_messages()
+            return llm_cache.contains(dumps(messages), model._get_llm_string())
+        except Exception:
+            return False
+
+    return is_cached
+
+
+def _retryable_errors(backend: str) -> tuple:
+    if backend == "groq":
+        import groq
+
+        return (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError)
+    return ()
+
+
+def current_backend() -> str:
+    """The configured PITCH_LLM_BACKEND.
+
+    Callers that memoize chains (`main._build_chains`, `agents._build_agent_chains`)
+    take it as their cache key, so switching the backend at runtime builds
+    fresh chains instead of reusing ones bound to the old client.
+    """
+    return os.getenv("PITCH_LLM_BACKEND", "groq").lower()
+
+
+def get_llm(temperature: float = 0.2, json_mode: bool = False) -> Runnable:
+    """Return the shared, rate-limited chat model for `temperature`, building it on first use.
+
+    `json_mode` asks the provider for a JSON object reply (the fake backend
+    always produces JSON when the prompt carries a schema).
+    """
+    backend = current_backend()
+    key = (backend, temperature, json_mode)
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            client = _build_client(backend, temperature, json_mode)
+            if backend == "fake":
+                _CLIENTS[key] = client  # in-process; no quota to protect
+            else:
+                _CLIENTS[key] = limited(
+                    client,
+                    retry_on=_retryable_errors(backend),
+                    is_cached=_cache_hit(client),
+                )
+        return _CLIENTS[key]
+
+
+def _json_mode_failure(exc: Exception) -> Optional[Tuple[str, str]]:
+    """`(failed_generation, message)` if `exc` is a JSON-mode validation error, else None.
+
+    Groq rejects a JSON-mode reply that is not valid JSON with a 400
+    `json_validate_failed` error whose body carries the model's output.
+    """
+    body = getattr(exc, "body", None)
+    error = body.get("error", body) if isinstance(body, dict) else None
+    if not isinstance(error, dict) or error.get("code") != "json_validate_failed":
+        return None
+    return error.get("failed_generation") or "", error.get("message") or str(exc)
+
+
+def structured_chain(prompt: ChatPromptTemplate, parser: BaseOutputParser, temperature: float = 0.2,
+                     json_mode: bool = True) -> Runnable:
+    """`prompt | llm | parser` in JSON mode, with one repair call if the reply does not parse.
+
+    Pass `json_mode=False` for chains whose replies are streamed token by
+    token: Groq does not stream in JSON mode, and the tolerant parser plus
+    the repair call cover replies that are not clean JSON.
+
+    A reply the provider itself rejects in JSON mode (`json_validate_failed`)
+    is repaired the same way, from the failed generation in the error body.
+    Only this chain is retried, so sibling branches of a `RunnableParallel`
+    are never recomputed. The repair prompt differs from the original (it
+    carries the bad reply and the parser error), so it cannot re-hit the
+    cached bad answer.
+    """
+    generate = prompt | get_llm(temperature, json_mode=json_mode)
+    repair = build_repair_prompt() | get_llm(0.0, json_mode=json_mode)
+    format_instructions = parser.get_format_instructions()
+    schema_name = getattr(getattr(parser, "pydantic_object", None), "__name__", parser.get_name())
+
+    def repair_inputs(output: str, error: str) -> Dict[str, str]:
+        logger.warning("Repairing unparseable %s reply: %s", schema_name, error.splitlines()[0] if error else "")
+        return {"format_instructions": format_instructions, "output": output, "error": error}
+
+    def rejected(exc: Exception) -> Dict[str, str]:
+        failure = _json_mode_failure(exc)
+        if failure is None:
+            raise exc
+        return repair_inputs(*failure)
+
+    def call(inputs, config):
+        try:
+            message = generate.invoke(inputs, config)
+        except Exception as e:
+            return parser.invoke(repair.invoke(rejected(e), config), config)
+        try:
+            return parser.invoke(message, config)
+        except OutputParserException as e:
+            return parser.invoke(repair.invoke(repair_inputs(message.content, str(e)), config), config)
+
+    async def acall(inputs, config):
+        try:
+            message = await generate.ainvoke(inputs, config)
+        except Exception as e:
+            return await parser.ainvoke(await repair.ainvoke(rejected(e), config), config)
+        try:
+            return await parser.ainvoke(message, config)
+        except OutputParserException as e:
+            return await parser.ainvoke(await repair.ainvoke(repair_inputs(message.content, str(e)), config), config)
+
+    return RunnableLambda(call, afunc=acall, name=f"structured_{schema_name}")
+
+
+__all__ = ["FakeSchemaChatModel", "get_llm", "structured_chain", "current_backend", "BACKENDS"]
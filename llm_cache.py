@@ -0,0 +1,131 @@
+"""Persistent SQLite cache for LLM responses.
+
+Plugs into LangChain's cache interface, so any chat model constructed with
+`cache=llm_cache` skips the API call when it has already answered the exact
+same rendered prompt with the same model configuration (model name,
+temperature, ...). Entries expire after a TTL and the table is trimmed to a
+maximum number of entries, least recently used first.
+
+Configuration (environment):
+  LLM_CACHE_PATH         SQLite file (default: .cache/llm_cache.sqlite)
+  LLM_CACHE_TTL_SEC      entry lifetime in seconds (default: 7 days)
+  LLM_CACHE_MAX_ENTRIES  size cap (default: 5000, 0 disables the cache)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class SQLiteLLMCache(BaseCache):
+    """LLM response cache keyed by a hash of (rendered prompt, llm configuration)."""
+
+    def __init__(self, path: str, ttl_sec: float = 7 * 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (last_access)")
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        h = hashlib.sha256()
+        h.update(llm_string.encode("utf-8"))
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_sec:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # `loads` is flagged as beta by langchain_core
+                return [loads(gen) for gen in loads(row[0])]
+        except Exception:
+            logger.warning("Dropping unreadable LLM cache entry %s", key)
+            self._delete(key)
+            return None
+
+    def contains(self, prompt: str, llm_string: str) -> bool:
+        """True if `lookup` would return an entry (no deserialization, no access-time update)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created FROM llm_cache WHERE key = ?", (self._key(prompt, llm_string),)
+            ).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl_sec
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        value = dumps([dumps(gen) for gen in return_val])
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            # expire old entries, then trim to max_entries by least recent access
+            self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl_sec,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM llm_cache")
+
+
+def _build_llm_cache() -> Optional[SQLiteLLMCache]:
+    max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    if max_entries <= 0:
+        return None
+    return SQLiteLLMCache(
+        path=os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite")),
+        ttl_sec=float(os.getenv("LLM_CACHE_TTL_SEC", str(7 * 24 * 3600))),
+        max_entries=max_entries,
+    )
+
+
+# Shared by every chat model in main.py and agents.py (None when disabled)
+llm_cache = _build_llm_cache()
+
+
+__all__ = ["SQLiteLLMCache", "llm_cache"]
@@ -1,20 +1,28 @@
-"""Main backend logic for LLM-based content analysis using langchain_groq.
+"""Main backend logic for LLM-based content analysis.
 
-This module exposes `analyze_pitch_with_viability` which uses real LLM chains
-to evaluate pitch dimensions, structure, and business viability.
+This module exposes `analyze_pitch_with_viability` (and its asyncio twin
+`analyze_pitch_with_viability_async`) which use real LLM chains to evaluate
+pitch dimensions, structure, and business viability, plus
+`condense_transcript`, which map-reduces long transcripts to a token budget
+before they are sent to the chains.
 """
+import asyncio
+import concurrent.futures
 import os
 import json
-from typing import Dict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
 
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain_core.runnables import RunnableParallel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable, RunnableParallel
 
+from llm import current_backend, get_llm, structured_chain
 from parsers import (
+    TolerantPydanticOutputParser,
     ScoreReason,
     PitchStructureResult,
+    ConsolidatedScores,
     BusinessViabilityResult,
 )
 from prompts import (
@@ -25,61 +33,293 @@ from prompts import (
     build_revenue_prompt,
     build_competition_prompt,
     build_structure_prompt,
+    build_consolidated_prompt,
+    build_condense_prompt,
     build_viability_prompt,
 )
 
 load_dotenv()
 
-# Initialize LLM with retry logic for rate limits
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.2,
-    api_key=os.getenv("GROQ_API_KEY"),
-    max_retries=3,
-)
-
 # Initialize parsers
-score_reason_parser = PydanticOutputParser(pydantic_object=ScoreReason)
-structure_parser = PydanticOutputParser(pydantic_object=PitchStructureResult)
-viability_parser = PydanticOutputParser(pydantic_object=BusinessViabilityResult)
+score_reason_parser = TolerantPydanticOutputParser(pydantic_object=ScoreReason)
+structure_parser = TolerantPydanticOutputParser(pydantic_object=PitchStructureResult)
+consolidated_parser = TolerantPydanticOutputParser(pydantic_object=ConsolidatedScores)
+viability_parser = TolerantPydanticOutputParser(pydantic_object=BusinessViabilityResult)
 
 # Format instructions with escaped braces
 _score_instructions = score_reason_parser.get_format_instructions().replace('{', '{{').replace('}', '}}')
 _structure_instructions = structure_parser.get_format_instructions().replace('{', '{{').replace('}', '}}')
+_consolidated_instructions = consolidated_parser.get_format_instructions().replace('{', '{{').replace('}', '}}')
 _viability_instructions = viability_parser.get_format_instructions().replace('{', '{{').replace('}', '}}')
 
-# Build all chains
-problem_chain = build_problem_prompt(_score_instructions) | llm | score_reason_parser
-product_diff_chain = build_product_diff_prompt(_score_instructions) | llm | score_reason_parser
-bm_chain = build_business_model_prompt(_score_instructions) | llm | score_reason_parser
-market_chain = build_market_prompt(_score_instructions) | llm | score_reason_parser
-revenue_chain = build_revenue_prompt(_score_instructions) | llm | score_reason_parser
-competition_chain = build_competition_prompt(_score_instructions) | llm | score_reason_parser
-structure_chain = build_structure_prompt(_structure_instructions) | llm | structure_parser
-viability_chain = build_viability_prompt(_viability_instructions) | llm | viability_parser
-
-# Parallel dimensions evaluation
-dimensions_parallel = RunnableParallel(
-    problem_clarity=problem_chain,
-    product_differentiation=product_diff_chain,
-    business_model_strength=bm_chain,
-    market_opportunity=market_chain,
-    revenue_logic=revenue_chain,
-    competition_awareness=competition_chain,
-    pitch_structure=structure_chain,
+# Dimension name -> chain that scores it (the branches of `dimensions_parallel`)
+DIMENSION_CHAINS = {
+    "problem_clarity": "problem_chain",
+    "product_differentiation": "product_diff_chain",
+    "business_model_strength": "bm_chain",
+    "market_opportunity": "market_chain",
+    "revenue_logic": "revenue_chain",
+    "competition_awareness": "competition_chain",
+    "pitch_structure": "structure_chain",
+}
+
+_CHAIN_NAMES = (
+    "llm", "problem_chain", "product_diff_chain", "bm_chain", "market_chain",
+    "revenue_chain", "competition_chain", "structure_chain", "viability_chain",
+    "consolidated_chain", "condense_chain", "dimensions_parallel",
 )
 
 
-def analyze_pitch_with_viability(transcript: str) -> Dict:
+@lru_cache(maxsize=None)
+def _build_chains(backend: str) -> Dict[str, Runnable]:
+    llm = get_llm(temperature=0.2)
+
+    chains = {"llm": llm}
+    chains["problem_chain"] = structured_chain(build_problem_prompt(_score_instructions), score_reason_parser)
+    chains["product_diff_chain"] = structured_chain(build_product_diff_prompt(_score_instructions), score_reason_parser)
+    chains["bm_chain"] = structured_chain(build_business_model_prompt(_score_instructions), score_reason_parser)
+    chains["market_chain"] = structured_chain(build_market_prompt(_score_instructions), score_reason_parser)
+    chains["revenue_chain"] = structured_chain(build_revenue_prompt(_score_instructions), score_reason_parser)
+    chains["competition_chain"] = structured_chain(build_competition_prompt(_score_instructions), score_reason_parser)
+    chains["structure_chain"] = structured_chain(build_structure_prompt(_structure_instructions), structure_parser)
+    chains["viability_chain"] = structured_chain(build_viability_prompt(_viability_instructions), viability_parser)
+
+    # Single-call alternative to dimensions_parallel: one prompt, one combined schema
+    chains["consolidated_chain"] = structured_chain(build_consolidated_prompt(_consolidated_instructions), consolidated_parser)
+
+    # Map step of long-transcript condensation (plain-text notes per chunk)
+    chains["condense_chain"] = build_condense_prompt() | llm | StrOutputParser()
+
+    # Parallel dimensions evaluation
+    chains["dimensions_parallel"] = RunnableParallel(
+        {name: chains[chain_name] for name, chain_name in DIMENSION_CHAINS.items()}
+    )
+    return chains
+
+
+def get_chains() -> Dict[str, Runnable]:
+    """Build every chain on first use, on the shared client from `llm.get_llm`.
+
+    The chains are also reachable as module attributes (`main.viability_chain`, ...).
     """
-    1) Runs all dimension chains + pitch structure in parallel.
-    2) Feeds results + transcript into business viability LLM.
-    3) Returns a combined dict.
+    return _build_chains(current_backend())
+
+
+def __getattr__(name: str):
+    if name in _CHAIN_NAMES:
+        return get_chains()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Transcripts estimated above TRANSCRIPT_TOKEN_BUDGET tokens are condensed
+# before scoring; the map step works on chunks of ~CONDENSE_CHUNK_TOKENS
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "6000"))
+CONDENSE_CHUNK_TOKENS = int(os.getenv("CONDENSE_CHUNK_TOKENS", "2500"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English speech)."""
+    return len(text) // 4 + 1
+
+
+def _fmt_time(sec: Optional[float]) -> str:
+    if sec is None:
+        return "--:--"
+    sec = int(sec)
+    return f"{sec // 60:02d}:{sec % 60:02d}"
+
+
+def chunk_segments(segments: List[dict], max_tokens: int) -> List[dict]:
+    """Group consecutive transcript segments into chunks of at most ~`max_tokens`.
+
+    Chunks never split a segment, so each keeps a clean (start, end) span.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for seg in segments:
+        text = seg["text"].strip()
+        if not text:
+            continue
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(dict(seg, text=text))
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return [
+        {
+            "start": chunk[0].get("start"),
+            "end": chunk[-1].get("end"),
+            "text": " ".join(seg["text"] for seg in chunk),
+        }
+        for chunk in chunks
+    ]
+
+
+def _fallback_segments(transcript: str, max_tokens: int) -> List[dict]:
+    """Untimed pseudo-segments (runs of words) for transcripts without segments.
+
+    Words are packed up to the character count `estimate_tokens` maps to
+    `max_tokens`, so every pseudo-segment fits a chunk (a single longer word
+    is kept on its own).
+    """
+    max_chars = max(1, (max_tokens - 1) * 4)
+    runs, current, size = [], [], 0
+    for word in transcript.split():
+        if current and size + 1 + len(word) > max_chars:
+            runs.append(current)
+            current, size = [], 0
+        size += len(word) + (1 if current else 0)
+        current.append(word)
+    if current:
+        runs.append(current)
+    return [{"start": None, "end": None, "text": " ".join(run)} for run in runs]
+
+
+def _condense_plan(transcript: str, segments: Optional[List[dict]], budget: int, chunk_tokens: int):
+    """Return the map-step chunks, or None when the transcript already fits `budget`."""
+    if estimate_tokens(transcript) <= budget:
+        return None
+    chunks = chunk_segments(segments or _fallback_segments(transcript, chunk_tokens), chunk_tokens)
+    return chunks if len(chunks) > 1 else None
+
+
+def _condense_inputs(chunks: List[dict]) -> List[Dict]:
+    return [
+        {
+            "part": i + 1,
+            "total": len(chunks),
+            "span": f"{_fmt_time(c['start'])}–{_fmt_time(c['end'])}",
+            "text": c["text"],
+        }
+        for i, c in enumerate(chunks)
+    ]
+
+
+def _reduce_notes(chunks: List[dict], notes: List[str]) -> List[dict]:
+    """Pair each chunk's span with its notes; the result can be condensed again if needed."""
+    return [
+        {"start": c["start"], "end": c["end"], "text": f"[{_fmt_time(c['start'])}–{_fmt_time(c['end'])}] {note.strip()}"}
+        for c, note in zip(chunks, notes)
+    ]
+
+
+def condense_transcript(
+    transcript: str,
+    segments: Optional[List[dict]] = None,
+    budget_tokens: Optional[int] = None,
+    chunk_tokens: Optional[int] = None,
+) -> str:
+    """Map-reduce a long transcript down to `budget_tokens` (estimated).
+
+    Short transcripts are returned unchanged. Long ones are chunked along
+    `segments` boundaries, each chunk is summarized in parallel (bounded by
+    the shared LLM limiter), and the time-stamped notes are joined in order.
+    If the joined notes still exceed the budget they are condensed again.
+    """
+    budget = budget_tokens or TRANSCRIPT_TOKEN_BUDGET
+    chunk_tokens = chunk_tokens or CONDENSE_CHUNK_TOKENS
+    text = transcript
+    while (chunks := _condense_plan(text, segments, budget, chunk_tokens)) is not None:
+        notes = get_chains()["condense_chain"].batch(_condense_inputs(chunks))
+        segments = _reduce_notes(chunks, notes)
+        condensed = "\n\n".join(seg["text"] for seg in segments)
+        if len(condensed) >= len(text):  # no progress; keep what we have
+            break
+        text = condensed
+    return text
+
+
+async def acondense_transcript(
+    transcript: str,
+    segments: Optional[List[dict]] = None,
+    budget_tokens: Optional[int] = None,
+    chunk_tokens: Optional[int] = None,
+) -> str:
+    """Async version of `condense_transcript` built on `abatch`."""
+    budget = budget_tokens or TRANSCRIPT_TOKEN_BUDGET
+    chunk_tokens = chunk_tokens or CONDENSE_CHUNK_TOKENS
+    text = transcript
+    while (chunks := _condense_plan(text, segments, budget, chunk_tokens)) is not None:
+        notes = await get_chains()["condense_chain"].abatch(_condense_inputs(chunks))
+        segments = _reduce_notes(chunks, notes)
+        condensed = "\n\n".join(seg["text"] for seg in segments)
+        if len(condensed) >= len(text):
+            break
+        text = condensed
+    return text
+
+
+# "parallel": 7 focused chains with few-shot examples (default, most robust)
+# "consolidated": 1 structured call for all dimensions (~7x fewer input tokens)
+SCORING_MODES = ("parallel", "consolidated")
+
+
+# on_dimension(name, result_dict) is called once per dimension as soon as it is scored
+DimensionCallback = Callable[[str, Dict], None]
+
+
+def _score_dimensions(transcript: str, scoring_mode: str, on_dimension: Optional[DimensionCallback] = None) -> Dict:
+    """Run the first stage and return the per-dimension results keyed like `dimensions_parallel`.
+
+    With `on_dimension`, parallel chains are awaited in completion order and
+    reported one by one from the calling thread.
     """
-    # 1) Parallel dimension evaluation
-    dim_results = dimensions_parallel.invoke({"transcript": transcript})
+    chains = get_chains()
+    inputs = {"transcript": transcript}
+    if scoring_mode == "consolidated":
+        results = dict(chains["consolidated_chain"].invoke(inputs))
+        if on_dimension:
+            for name, res in results.items():
+                on_dimension(name, res.model_dump())
+        return results
+    if scoring_mode != "parallel":
+        raise ValueError(f"Unknown scoring_mode {scoring_mode!r}; expected one of {SCORING_MODES}")
+    if on_dimension is None:
+        return chains["dimensions_parallel"].invoke(inputs)
 
-    # 2) Convert Pydantic objects to dicts
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(DIMENSION_CHAINS)) as ex:
+        futures = {
+            ex.submit(chains[chain_name].invoke, inputs): name
+            for name, chain_name in DIMENSION_CHAINS.items()
+        }
+        for fut in concurrent.futures.as_completed(futures):
+            name = futures[fut]
+            results[name] = fut.result()
+            on_dimension(name, results[name].model_dump())
+    return {name: results[name] for name in DIMENSION_CHAINS}
+
+
+async def _ascore_dimensions(transcript: str, scoring_mode: str, on_dimension: Optional[DimensionCallback] = None) -> Dict:
+    chains = get_chains()
+    inputs = {"transcript": transcript}
+    if scoring_mode == "consolidated":
+        results = dict(await chains["consolidated_chain"].ainvoke(inputs))
+        if on_dimension:
+            for name, res in results.items():
+                on_dimension(name, res.model_dump())
+        return results
+    if scoring_mode != "parallel":
+        raise ValueError(f"Unknown scoring_mode {scoring_mode!r}; expected one of {SCORING_MODES}")
+    if on_dimension is None:
+        return await chains["dimensions_parallel"].ainvoke(inputs)
+
+    async def score(name: str, chain_name: str):
+        return name, await chains[chain_name].ainvoke(inputs)
+
+    results = {}
+    for next_done in asyncio.as_completed([score(n, c) for n, c in DIMENSION_CHAINS.items()]):
+        name, res = await next_done
+        results[name] = res
+        on_dimension(name, res.model_dump())
+    return {name: results[name] for name in DIMENSION_CHAINS}
+
+
+def _viability_inputs(transcript: str, dim_results: Dict) -> Dict:
+    """Convert parallel dimension results to dicts and build the viability chain input."""
     dim_scores_dict = {
         "problem_clarity": dim_results["problem_clarity"].model_dump(),
         "product_differentiation": dim_results["product_differentiation"].model_dump(),
@@ -90,29 +330,69 @@ def analyze_pitch_with_viability(transcript: str) -> Dict:
     }
     pitch_structure_dict = dim_results["pitch_structure"].model_dump()
 
-    # 3) JSON strings for viability prompt
-    dimension_scores_json = json.dumps(dim_scores_dict, ensure_ascii=False, indent=2)
-    pitch_structure_json = json.dumps(pitch_structure_dict, ensure_ascii=False, indent=2)
-
-    # 4) Business viability (second stage)
+    # JSON strings for viability prompt
     # Note: The viability_chain is designed to accept these as plain text
-    viability_result = viability_chain.invoke(
-        {
+    return {
+        "dimensions": dim_scores_dict,
+        "pitch_structure": pitch_structure_dict,
+        "inputs": {
             "transcript": transcript,
-            "dimension_scores": dimension_scores_json,
-            "pitch_structure": pitch_structure_json,
-        }
-    )
+            "dimension_scores": json.dumps(dim_scores_dict, ensure_ascii=False, indent=2),
+            "pitch_structure": json.dumps(pitch_structure_dict, ensure_ascii=False, indent=2),
+        },
+    }
+
+
+def analyze_pitch_with_viability(
+    transcript: str,
+    scoring_mode: str = "parallel",
+    on_dimension: Optional[DimensionCallback] = None,
+) -> Dict:
+    """
+    1) Runs all dimension chains + pitch structure in parallel
+       (or one consolidated call when `scoring_mode="consolidated"`),
+       calling `on_dimension(name, result)` as each one finishes.
+    2) Feeds results + transcript into business viability LLM.
+    3) Returns a combined dict.
+    """
+    # 1) Dimension evaluation
+    dim_results = _score_dimensions(transcript, scoring_mode, on_dimension)
 
-    # 5) Combine everything
+    # 2) Convert Pydantic objects to dicts / JSON for the viability prompt
+    stage2 = _viability_inputs(transcript, dim_results)
+
+    # 3) Business viability (second stage)
+    viability_result = get_chains()["viability_chain"].invoke(stage2["inputs"])
+
+    # 4) Combine everything
     final = {
-        "dimensions": dim_scores_dict,
-        "pitch_structure": pitch_structure_dict,
+        "dimensions": stage2["dimensions"],
+        "pitch_structure": stage2["pitch_structure"],
         "business_viability": viability_result.model_dump(),
     }
     return final
 
 
+async def analyze_pitch_with_viability_async(
+    transcript: str,
+    scoring_mode: str = "parallel",
+    on_dimension: Optional[DimensionCallback] = None,
+) -> Dict:
+    """Async version of `analyze_pitch_with_viability` built on `ainvoke`.
+
+    Many evaluations can run on one event loop; the shared limiter in
+    `rate_limit` caps the total number of in-flight LLM requests.
+    """
+    dim_results = await _ascore_dimensions(transcript, scoring_mode, on_dimension)
+    stage2 = _viability_inputs(transcript, dim_results)
+    viability_result = await get_chains()["viability_chain"].ainvoke(stage2["inputs"])
+    return {
+        "dimensions": stage2["dimensions"],
+        "pitch_structure": stage2["pitch_structure"],
+        "business_viability": viability_result.model_dump(),
+    }
+
+
 if __name__ == "__main__":
     # quick manual test
     import sys
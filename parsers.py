@@ -1,8 +1,13 @@
 """Pydantic output parsers and model schemas used by the pipeline.
 These mirror the structures expected by the LLM chains.
 """
+import json
+import re
+from typing import Any, List
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, conint
-from typing import List
 
 
 class ScoreReason(BaseModel):
@@ -20,6 +25,17 @@ class PitchStructureResult(BaseModel):
     structure_comment: str
 
 
+class ConsolidatedScores(BaseModel):
+    """All six dimensions plus pitch structure, scored in a single LLM call."""
+    problem_clarity: ScoreReason
+    product_differentiation: ScoreReason
+    business_model_strength: ScoreReason
+    market_opportunity: ScoreReason
+    revenue_logic: ScoreReason
+    competition_awareness: ScoreReason
+    pitch_structure: PitchStructureResult
+
+
 class BusinessViabilityResult(BaseModel):
     score: conint(ge=0, le=100)
     risk_level: str
@@ -38,9 +54,51 @@ class PanelOutput(BaseModel):
     panel_decision: str
 
 
+_FENCED = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_DECODER = json.JSONDecoder(strict=False)  # tolerate raw newlines inside strings
+
+
+def extract_json(text: str) -> Any:
+    """Return the first JSON object found in an LLM reply.
+
+    Handles ```json fences, prose before or after the object, raw control
+    characters inside strings and trailing commas. Raises ValueError if no
+    object can be decoded.
+    """
+    candidates = _FENCED.findall(text) + [text]
+    for candidate in candidates:
+        for attempt in (candidate, _TRAILING_COMMA.sub(r"\1", candidate)):
+            start = attempt.find("{")
+            while start != -1:
+                try:
+                    obj, _ = _DECODER.raw_decode(attempt, start)
+                    return obj
+                except ValueError:
+                    start = attempt.find("{", start + 1)
+    raise ValueError("No JSON object found in model output")
+
+
+class TolerantPydanticOutputParser(PydanticOutputParser):
+    """`PydanticOutputParser` that locates the JSON with `extract_json` first."""
+
+    def parse_result(self, result, *, partial: bool = False):
+        if partial:
+            return super().parse_result(result, partial=True)
+        text = result[0].text
+        try:
+            obj = extract_json(text)
+        except ValueError as e:
+            raise OutputParserException(f"Invalid json output: {e}", llm_output=text) from e
+        return self._parse_obj(obj)
+
+
 __all__ = [
+    "extract_json",
+    "TolerantPydanticOutputParser",
     "ScoreReason",
     "PitchStructureResult",
+    "ConsolidatedScores",
     "BusinessViabilityResult",
     "PersonaFeedback",
     "PanelOutput",
@@ -1,115 +1,393 @@
 """Pipeline orchestrator.
-Runs audio extraction, transcription and tone analysis in parallel, then runs
-content analysis, and finally runs the shark panel evaluation.
+Runs the pipeline as a small DAG of stages with declared inputs: audio
+extraction feeds transcription and tone analysis, content analysis starts as
+soon as the transcript is ready (while tone may still be running), and the
+shark panel runs once both are done.
 Provides callback hooks so the UI can receive updates.
 """
 import concurrent.futures
-import os
-from typing import Callable, Dict
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+import numpy as np
 from logging_config import get_logger
+from cache import artifact_cache
 
-from audio import extract_audio_from_video, make_temp_wav_path
-from transcribe import transcribe_audio
-from tone import analyze_tone
-from main import analyze_pitch_with_viability
+from audio import audio_cache_key, is_audio_file, iter_audio_chunks, load_audio
+from transcribe import transcribe_audio, transcribe_stream
+from tone import analyze_tone_windowed, get_tone_pool
+from main import analyze_pitch_with_viability, condense_transcript, estimate_tokens
 from agents import run_shark_panel
 
 logger = get_logger(__name__)
 
 
-def run_pipeline(video_path: str, callback: Callable[[str, Dict], None] = None) -> Dict:
+def _drain_events(events: "queue.Queue", callback: Callable[[str, Dict], None] = None):
+    """Forward queued (stage, payload) events from worker threads to `callback`."""
+    while True:
+        try:
+            stage, payload = events.get_nowait()
+        except queue.Empty:
+            return
+        if callback:
+            callback(stage, payload)
+
+
+_END_OF_STREAM = object()
+
+
+class _StreamFailed(NamedTuple):
+    """Sent instead of `_END_OF_STREAM` when decoding fails, so consumers raise instead of finishing."""
+    error: BaseException
+
+# Decoded chunks buffered per streaming consumer (10 s each, ~640 KB); a slower
+# consumer makes ffmpeg wait instead of the whole file piling up in memory
+STREAM_QUEUE_CHUNKS = 8
+
+
+class _ChunkQueue:
+    """Bounded hand-off of audio chunks from the decoder thread to one consumer.
+
+    Iterating yields the chunks until the producer closes the stream. When the
+    consumer stops early (the iterator is closed, e.g. on a transcript cache
+    hit, or the consumer raised), the queue is marked closed and the producer
+    stops feeding it instead of blocking on a full queue forever.
+    """
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_CHUNKS):
+        self._q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self.closed = threading.Event()
+
+    def put(self, item) -> bool:
+        """Block until `item` is queued; False if the consumer has gone away."""
+        while not self.closed.is_set():
+            try:
+                self._q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self) -> None:
+        self.closed.set()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        try:
+            while True:
+                item = self._q.get()
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, _StreamFailed):
+                    raise RuntimeError(f"Audio stream failed: {item.error}") from item.error
+                yield item
+        finally:
+            self.close()
+
+    def consume(self, fn: Callable[[Iterator[np.ndarray]], Any]) -> Any:
+        """Return `fn(chunks)`, closing the queue however `fn` exits (even before it starts iterating)."""
+        try:
+            return fn(iter(self))
+        finally:
+            self.close()
+
+
+def _fan_out(chunks: Iterable[np.ndarray], queues: List[_ChunkQueue], events: "queue.Queue"):
+    """Copy every audio chunk into each consumer queue, then close them.
+
+    Decoding stops early once every consumer has gone away. If decoding
+    fails, consumers get the error instead of a normal end of stream, so a
+    partial stream is never mistaken for the whole file.
+    """
+    chunks = iter(chunks)
+    end = _END_OF_STREAM
+    try:
+        for chunk in chunks:
+            delivered = [q.put(chunk) for q in queues]
+            if not any(delivered):
+                break
+        events.put(("extract_audio.done", {}))
+    except BaseException as e:
+        end = _StreamFailed(e)
+        raise
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()  # stops ffmpeg if we broke out early
+        for q in queues:
+            q.put(end)
+
+
+def segment_tone_metrics(segments: List[Dict], tone_acc) -> List[Dict]:
+    """Per-segment delivery metrics with what was said, so feedback can point at specific moments."""
+    return [
+        dict(metrics, text=seg["text"].strip())
+        for seg, metrics in zip(segments, tone_acc.segment_metrics(segments))
+    ]
+
+
+def compact_timeline(tone_segments: List[Dict]) -> List[Dict]:
+    """Rounded per-segment metrics for the shark prompts (keeps token count down)."""
+    return [
+        {
+            "t": f"{seg['start']:.0f}-{seg['end']:.0f}s",
+            "said": seg["text"][:60],
+            "energy": round(seg["energy_mean"], 3),
+            "pitch": round(seg["pitch_mean"]),
+            "silence": round(seg["silence_ratio"], 2),
+        }
+        for seg in tone_segments
+    ]
+
+
+class Stage(NamedTuple):
+    """One node of the pipeline DAG: `run(**deps)` starts once every stage in `deps` has finished."""
+    name: str
+    run: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+
+
+def run_stages(
+    stages: List[Stage],
+    executor: concurrent.futures.Executor,
+    events: "queue.Queue",
+    callback: Callable[[str, Dict], None] = None,
+    on_start: Callable[[str], None] = None,
+    on_done: Callable[[str, Any], None] = None,
+) -> Dict[str, Any]:
+    """Run `stages` on `executor`, each as soon as its dependencies resolve.
+
+    Each stage receives its dependencies' results as keyword arguments named
+    after them. `on_start`, `on_done` and the forwarding of queued worker
+    `events` to `callback` all happen on the calling thread. The first stage
+    error is raised; returns every stage's result by name.
+    """
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        missing = set(stage.deps) - names
+        if missing:
+            raise ValueError(f"Stage {stage.name!r} depends on unknown stages {sorted(missing)}")
+
+    finished: Dict[str, Any] = {}
+    waiting = list(stages)
+    running: Dict[concurrent.futures.Future, str] = {}
+    while waiting or running:
+        for stage in [s for s in waiting if all(d in finished for d in s.deps)]:
+            waiting.remove(stage)
+            if on_start:
+                on_start(stage.name)
+            running[executor.submit(stage.run, **{d: finished[d] for d in stage.deps})] = stage.name
+        if not running:
+            raise ValueError(f"Stages {[s.name for s in waiting]} have circular dependencies")
+
+        done, _ = concurrent.futures.wait(
+            running, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        _drain_events(events, callback)
+        for fut in done:
+            name = running.pop(fut)
+            finished[name] = fut.result()
+            if on_done:
+                on_done(name, finished[name])
+    _drain_events(events, callback)
+    return finished
+
+
+def run_pipeline(
+    video_path: str,
+    callback: Callable[[str, Dict], None] = None,
+    transcribe_workers: int = 1,
+    stream_audio: bool = False,
+    tone_in_process: bool = False,
+    scoring_mode: str = "parallel",
+) -> Dict:
     """Run the full pipeline and call `callback(stage, payload)` as stages progress.
 
-    Stages: extract_audio, transcribe, tone, analysis, shark_panel, done
+    `video_path` may be a video or an audio-only recording (wav/mp3/m4a/ogg);
+    16k mono PCM WAVs are used without re-encoding.
+
+    `transcribe_workers` > 1 transcribes long recordings in parallel chunks
+    split at silences, one chunk per worker (buffered mode only).
+
+    `stream_audio` overlaps extraction with stage 2: ffmpeg's output is consumed
+    in chunks by transcription and tone analysis as it is decoded, so
+    `extract_audio.done` arrives while they are still running. At most
+    `STREAM_QUEUE_CHUNKS` chunks wait per consumer; when one falls behind,
+    decoding pauses until it catches up.
+
+    `tone_in_process` runs tone analysis on the persistent, pre-warmed process
+    pool from `tone.get_tone_pool` so NumPy/SciPy work does not contend with
+    transcription for the GIL (buffered mode only; streaming keeps it on a thread).
+
+    `scoring_mode` selects how content is scored: "parallel" (seven focused
+    chains) or "consolidated" (one structured call, far fewer tokens). Transcripts
+    over `main.TRANSCRIPT_TOKEN_BUDGET` are condensed first and the condensed text
+    is stored in `results['condensed_transcript']`.
+
+    Tone analysis runs block by block in bounded memory; besides the global
+    `tone_scores`, `results['tone_segments']` holds delivery metrics aligned
+    with each transcript segment.
+
+    Stages (see `run_stages`): audio → transcript, tone; transcript → content;
+    transcript + tone → tone_segments; tone + tone_segments + content → sharks.
+    The critical path is max(tone, transcript + content) + sharks.
+
+    While transcription runs, each decoded segment is sent as
+    `transcribe.segment` with a payload of {'start', 'end', 'text'}. During
+    content analysis each dimension is sent as soon as it is scored as
+    `content.dimension` with a payload of {'name', 'result'}. The shark panel
+    streams `sharks.token` ({'node', 'delta', 'text'}) while each shark speaks
+    and `sharks.node` (the node's feedback and decision) when it finishes.
     """
     logger.info("=" * 60)
-    logger.info("Starting pipeline for video: %s", video_path)
+    logger.info("Starting pipeline for %s: %s", "audio" if is_audio_file(video_path) else "video", video_path)
     
-    temp_wav = make_temp_wav_path()
     if callback:
         callback("start", {})
 
-    # 1) extract audio
-    logger.info("Stage 1: Extracting audio (entire video)")
-    if callback:
-        callback("extract_audio", {})
-    extract_audio_from_video(video_path, temp_wav, max_duration_sec=None)
-    logger.info("Audio extracted to: %s", temp_wav)
-    if callback:
-        callback("extract_audio.done", {})
+    results = {}
+    # Stages run on worker threads and report progress through this queue, so
+    # that `callback` is always invoked from the caller's thread (Streamlit needs this).
+    events: "queue.Queue" = queue.Queue()
 
-    # 2) run transcription and tone analysis in parallel
-    logger.info("Stage 2: Running transcription and tone analysis in parallel")
-    if callback:
-        callback("parallel.start", {})
+    def emit(stage: str, payload: Dict):
+        events.put((stage, payload))
 
-    results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as ex:
-        fut_trans = ex.submit(transcribe_audio, temp_wav)
-        fut_tone = ex.submit(analyze_tone, temp_wav)
-
-        for fut in concurrent.futures.as_completed([fut_trans, fut_tone]):
-            if fut is fut_trans:
-                transcript, segments = fut.result()
-                results["transcript"] = transcript
-                results["segments"] = segments
-                logger.info("Transcription complete: %d words", len(transcript.split()))
-                if callback:
-                    callback("transcribe.done", {})
-            else:
-                tone_scores = fut.result()
-                results["tone_scores"] = tone_scores
-                logger.info("Tone analysis complete: confidence=%.1f, delivery=%.1f", 
-                          tone_scores.get('confidence_score', 0),
-                          tone_scores.get('delivery_score', 0))
-                if callback:
-                    callback("tone.done", {})
-    
-    if callback:
-        callback("parallel.done", {})
+    def on_segment(seg: Dict):
+        emit("transcribe.segment", seg)
 
-    # 3) run content analysis / viability
-    logger.info("Stage 3: Analyzing content and business viability")
-    if callback:
-        callback("content.start", {})
-    analysis = analyze_pitch_with_viability(results.get("transcript", ""))
-    results["analysis"] = analysis
-    logger.info("Content analysis complete: viability_score=%d", 
-               analysis.get('viability', {}).get('score', 0))
-    if callback:
-        callback("content.done", {})
-    
-    # Small delay between stages to avoid rate limits
-    import time
-    time.sleep(1)
+    # identifies the decoded audio so the transcript can be served from the cache
+    source_key = audio_cache_key(video_path) if artifact_cache.enabled else None
 
-    # 4) run shark panel evaluation (runs sequentially: visionary → finance → customer → skeptic → panel)
-    logger.info("Stage 4: Running shark panel evaluation")
-    if callback:
-        callback("sharks.start", {})
-    shark_result = run_shark_panel(
-        transcript=results["transcript"],
-        tone_scores=results["tone_scores"],
-        analysis=analysis,
-    )
-    results["shark_panel"] = shark_result
-    logger.info("Shark panel complete: final_recommendation=%s", 
-               shark_result.get('panel', {}).get('final_recommendation', 'N/A'))
-    if callback:
-        callback("sharks.done", {})
+    # ---- stage functions (arguments are the results of the declared deps) ----
+    if stream_audio:
+        # decode the audio as a stream and feed the chunks to transcription and
+        # tone analysis while ffmpeg is still reading the file
+        if transcribe_workers > 1:
+            logger.warning("transcribe_workers=%d has no effect with stream_audio; "
+                           "the stream is transcribed window by window", transcribe_workers)
+        trans_q, tone_q = _ChunkQueue(), _ChunkQueue()
+        stages = [
+            Stage("extract", lambda: _fan_out(iter_audio_chunks(video_path), [trans_q, tone_q], events)),
+            Stage("transcript", lambda: trans_q.consume(
+                lambda chunks: transcribe_stream(chunks, on_segment=on_segment, source_key=source_key))),
+            Stage("tone", lambda: tone_q.consume(analyze_tone_windowed)),
+        ]
+    else:
+        def run_tone(audio):
+            if tone_in_process:
+                return get_tone_pool().submit(analyze_tone_windowed, audio).result()
+            return analyze_tone_windowed(audio)
+
+        # audio is decoded once into memory and shared by both consumers
+        stages = [
+            Stage("audio", lambda: load_audio(video_path, max_duration_sec=None)),
+            Stage("transcript", lambda audio: transcribe_audio(
+                audio, on_segment=on_segment, workers=transcribe_workers, source_key=source_key,
+            ), deps=("audio",)),
+            Stage("tone", run_tone, deps=("audio",)),
+        ]
+
+    def run_tone_segments(transcript, tone):
+        return segment_tone_metrics(transcript[1], tone)
+
+    def run_content(transcript):
+        text, segments = transcript
+        # long talks are condensed once (map-reduce along segments) and the
+        # condensed text is what every content and shark chain sees
+        content_transcript = condense_transcript(text, segments)
+        if content_transcript != text:
+            logger.info("Transcript condensed: ~%d -> ~%d tokens",
+                        estimate_tokens(text), estimate_tokens(content_transcript))
+
+        def on_dimension(name, result):
+            emit("content.dimension", {"name": name, "result": result})
+
+        analysis = analyze_pitch_with_viability(content_transcript, scoring_mode=scoring_mode, on_dimension=on_dimension)
+        return content_transcript, analysis
+
+    def run_sharks(tone, tone_segments, content):
+        content_transcript, analysis = content
+        return run_shark_panel(
+            transcript=content_transcript,
+            tone_scores=dict(tone.result(), segment_timeline=compact_timeline(tone_segments)),
+            analysis=analysis,
+            on_event=emit,
+        )
+
+    stages += [
+        Stage("tone_segments", run_tone_segments, deps=("transcript", "tone")),
+        Stage("content", run_content, deps=("transcript",)),
+        Stage("sharks", run_sharks, deps=("tone", "tone_segments", "content")),
+    ]
+
+    # ---- progress reporting, on the caller's thread ----
+    start_events = {
+        "extract": ["extract_audio", "parallel.start"],
+        "audio": ["extract_audio"],
+        "transcript": [] if stream_audio else ["parallel.start"],
+        "content": ["content.start"],
+        "sharks": ["sharks.start"],
+    }
+
+    def on_start(name: str):
+        if name == "extract":
+            logger.info("Stage 1+2: Streaming audio into transcription and tone analysis")
+        elif name == "audio":
+            logger.info("Stage 1: Extracting audio (entire video)")
+        elif name == "content":
+            logger.info("Stage 3: Analyzing content and business viability (tone may still be running)")
+        elif name == "sharks":
+            logger.info("Stage 4: Running shark panel evaluation")
+        for stage in start_events.get(name, []):
+            if callback:
+                callback(stage, {})
+
+    def on_done(name: str, value):
+        if name == "audio":
+            logger.info("Audio extracted: %.1f sec", len(value) / 16000)
+            if callback:
+                callback("extract_audio.done", {})
+        elif name == "transcript":
+            results["transcript"], results["segments"] = value
+            logger.info("Transcription complete: %d words", len(results["transcript"].split()))
+            if callback:
+                callback("transcribe.done", {})
+        elif name == "tone":
+            results["tone_scores"] = value.result()
+            logger.info("Tone analysis complete: confidence=%.1f, delivery=%.1f", 
+                        results["tone_scores"].get('confidence_score', 0),
+                        results["tone_scores"].get('delivery_score', 0))
+            if callback:
+                callback("tone.done", {})
+        elif name == "tone_segments":
+            results["tone_segments"] = value
+            if callback:
+                callback("parallel.done", {})
+        elif name == "content":
+            content_transcript, results["analysis"] = value
+            if content_transcript != results["transcript"]:
+                results["condensed_transcript"] = content_transcript
+            logger.info("Content analysis complete: viability_score=%d", 
+                        results["analysis"].get('business_viability', {}).get('score', 0))
+            if callback:
+                callback("content.done", {})
+        elif name == "sharks":
+            results["shark_panel"] = value
+            logger.info("Shark panel complete: final_recommendation=%s", 
+                        value.get('panel_final_recommendation', 'N/A'))
+            if callback:
+                callback("sharks.done", {})
+
+    # content starts as soon as the transcript is ready, while tone may still
+    # be running; the sharks wait for both
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as ex:
+        run_stages(stages, ex, events, callback=callback, on_start=on_start, on_done=on_done)
 
     logger.info("Pipeline finished successfully")
     logger.info("=" * 60)
     if callback:
         callback("complete", {})
 
-    # clean up temp wav
-    try:
-        os.remove(temp_wav)
-    except Exception:
-        pass
-
     return results
 
 
-__all__ = ["run_pipeline"]
+__all__ = ["Stage", "run_stages", "run_pipeline", "segment_tone_metrics", "compact_timeline"]
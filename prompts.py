@@ -171,6 +171,61 @@ def build_structure_prompt(format_instructions: str) -> ChatPromptTemplate:
     ])
 
 
+def build_condense_prompt() -> ChatPromptTemplate:
+    """Map step of long-transcript condensation: summarize one chunk, keep the evidence."""
+    return ChatPromptTemplate.from_messages([
+        ("system",
+         "You condense one part of a long startup pitch transcript for VC evaluators. "
+         "Rewrite it as dense notes in the speaker's voice, keeping every concrete fact: "
+         "the problem and who has it, the product and how it differs, customers, pricing, "
+         "revenue, market numbers, traction, competitors, team, and any funding ask. "
+         "Keep numbers, names and quotes exact and keep the original order. "
+         "Drop filler, repetition and small talk. Do not add commentary or scores."),
+        ("user",
+         "PART {part} OF {total} ({span}):\n{text}\n\n"
+         "Condensed notes:"),
+    ])
+
+
+def build_consolidated_prompt(format_instructions: str) -> ChatPromptTemplate:
+    """All six dimensions + pitch structure in one call (token-saving mode)."""
+    return ChatPromptTemplate.from_messages([
+        ("system",
+         "You are a VC and pitch coach. Score a startup pitch transcript on every "
+         "dimension below in ONE JSON object. Each dimension gets an integer score "
+         "0–100 and a brief reason.\n"
+         "- problem_clarity: who is affected, what the concrete problem is, and its consequence.\n"
+         "- product_differentiation: how concretely the product is better than existing solutions "
+         "or the status quo.\n"
+         "- business_model_strength: who pays, what they pay for, and how often.\n"
+         "- market_opportunity: market size, growth, or urgency backed by specifics.\n"
+         "- revenue_logic: whether the way they make money fits the product, customer, and problem.\n"
+         "- competition_awareness: whether they name competitors, tools, or the status quo and "
+         "position against them.\n"
+         "- pitch_structure: whether a hook, problem, solution, and ask are present, their "
+         "detected_order, a structure_quality_score (0–100), and a structure_comment.\n"
+         "Vague claims without specifics score around 40–50; clear, specific answers score 85+.\n"
+         f"Output MUST follow the JSON schema.\n{format_instructions}"),
+        ("user",
+         "TRANSCRIPT:\n{transcript}\n\n"
+         "Now score every dimension and the pitch structure."),
+    ])
+
+
+def build_repair_prompt() -> ChatPromptTemplate:
+    """Second chance for a reply that failed to parse: fix the JSON, keep the content."""
+    return ChatPromptTemplate.from_messages([
+        ("system",
+         "You repair malformed JSON. Return ONLY one JSON object that follows the schema "
+         "below, keeping the values from the original reply wherever possible. "
+         "No code fences, no commentary.\n{format_instructions}"),
+        ("user",
+         "ORIGINAL REPLY:\n{output}\n\n"
+         "PARSER ERROR:\n{error}\n\n"
+         "Corrected JSON:"),
+    ])
+
+
 def build_viability_prompt(format_instructions: str) -> ChatPromptTemplate:
     """Business viability analysis (2nd stage)."""
     from langchain_core.prompts import HumanMessagePromptTemplate, SystemMessagePromptTemplate
@@ -223,5 +278,8 @@ __all__ = [
     "build_revenue_prompt",
     "build_competition_prompt",
     "build_structure_prompt",
+    "build_consolidated_prompt",
+    "build_condense_prompt",
+    "build_repair_prompt",
     "build_viability_prompt",
 ]
@@ -0,0 +1,302 @@
+"""Process-wide limits for outbound LLM requests.
+
+Every chain in `main.py` and `agents.py` calls the model through `limited(...)`,
+so the number of in-flight Groq requests is capped across all concurrent
+pitches, whether they run on threads (`invoke`) or on event loops (`ainvoke`).
+
+Before taking a concurrency slot, each request is admitted by a token bucket
+that tracks the provider's requests-per-minute and tokens-per-minute quotas.
+A 429 reply pauses the bucket for the server's Retry-After, so every caller
+backs off together instead of each one sleeping on its own schedule.
+Requests answered from the LLM cache skip both limits.
+
+Configuration (environment):
+  LLM_MAX_CONCURRENCY  maximum in-flight LLM requests per process (default: 8)
+  LLM_RPM              requests per minute (default: 30, 0 disables)
+  LLM_TPM              tokens per minute (default: 0, unlimited)
+  LLM_MAX_ATTEMPTS     attempts per request on rate-limit/transient errors (default: 4)
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional, Tuple, Type
+
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Room reserved for the completion when estimating a request's token cost
+OUTPUT_TOKENS_ESTIMATE = 600
+
+
+class ConcurrencyLimiter:
+    """Counting semaphore shared by threads and any number of asyncio loops.
+
+    Waiters are served in FIFO order; a released slot is handed directly to
+    the next waiter so late arrivals cannot starve earlier ones.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit must be >= 1")
+        self.limit = limit
+        self._in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        """Block the calling thread until a slot is available."""
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()  # the slot is transferred to us by release()
+
+    async def acquire_async(self) -> None:
+        """Wait on the running event loop until a slot is available."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            fut = loop.create_future()
+            entry = (loop, fut)
+            self._waiters.append(entry)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(entry)
+                    granted = False
+                except ValueError:
+                    granted = True
+            # if the slot was already handed to us, give it back; a cancelled
+            # future is handled by _wake when the hand-over lands
+            if granted and not fut.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._in_flight -= 1
+                return
+            waiter = self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, fut = waiter
+            try:
+                loop.call_soon_threadsafe(self._wake, fut)
+            except RuntimeError:  # the waiter's loop is closed; pass the slot on
+                self.release()
+
+    def _wake(self, fut: "asyncio.Future") -> None:
+        if fut.done():  # waiter was cancelled meanwhile; pass the slot on
+            self.release()
+        else:
+            fut.set_result(None)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute buckets shared by threads and event loops.
+
+    Both buckets start full and refill continuously. A limit of 0 disables
+    that bucket. `penalize` blocks all admissions until a deadline, which is
+    how a server's Retry-After is honored process-wide.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _try_take(self, tokens: int) -> float:
+        """Take one request and `tokens` tokens, or return the seconds to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            tokens = min(tokens, self.tpm)  # a single huge request must still fit eventually
+            wait = 0.0
+            if self.rpm and self._requests < 1:
+                wait = (1 - self._requests) * 60.0 / self.rpm
+            if self.tpm and self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> None:
+        """Block the calling thread until the request is admitted."""
+        while (wait := self._try_take(tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """Wait on the running event loop until the request is admitted."""
+        while (wait := self._try_take(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Correct the token bucket once the real usage of a request is known."""
+        if not self.tpm or actual is None:
+            return
+        with self._lock:
+            self._tokens = min(self.tpm, self._tokens + min(estimated, self.tpm) - actual)
+
+    def penalize(self, seconds: float) -> None:
+        """Admit nothing for `seconds` (e.g. the Retry-After of a 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+# One pitch fans out to seven content chains (six dimensions + viability);
+# the default keeps them in a single wave
+DEFAULT_MAX_CONCURRENCY = 8
+
+llm_limiter = ConcurrencyLimiter(int(os.getenv("LLM_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY))))
+llm_bucket = TokenBucketLimiter(
+    rpm=int(os.getenv("LLM_RPM", "30")),
+    tpm=int(os.getenv("LLM_TPM", "0")),
+)
+LLM_MAX_ATTEMPTS = max(1, int(os.getenv("LLM_MAX_ATTEMPTS", "4")))
+
+
+def estimate_request_tokens(input: Any) -> int:
+    """Rough token cost of a chat request: prompt at ~4 chars/token plus room for the reply."""
+    if hasattr(input, "to_string"):
+        text = input.to_string()
+    elif isinstance(input, (list, tuple)):
+        text = "".join(str(getattr(m, "content", m)) for m in input)
+    else:
+        text = str(input)
+    return len(text) // 4 + OUTPUT_TOKENS_ESTIMATE
+
+
+def _used_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def _retry_delay(exc: Exception, attempt: int) -> Tuple[float, bool]:
+    """Seconds to wait before retrying `exc`, and whether it was a rate limit (429)."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    is_rate_limit = getattr(exc, "status_code", None) == 429
+    try:
+        return float(headers.get("retry-after")), is_rate_limit
+    except (TypeError, ValueError):
+        return min(2.0 ** attempt, 30.0), is_rate_limit
+
+
+def limited(
+    runnable: Runnable,
+    limiter: ConcurrencyLimiter = None,
+    bucket: TokenBucketLimiter = None,
+    retry_on: Tuple[Type[BaseException], ...] = (),
+    is_cached: Optional[Callable[[Any], bool]] = None,
+) -> Runnable:
+    """Wrap `runnable` so each sync or async call is admitted by `bucket` and holds a slot of `limiter`.
+
+    Defaults are the process-wide `llm_bucket` and `llm_limiter`. Errors in
+    `retry_on` are retried up to LLM_MAX_ATTEMPTS times; a 429 pauses the
+    shared bucket for the server's Retry-After so all callers back off.
+    Inputs for which `is_cached(input)` is true are answered without
+    admission, since they make no request.
+    """
+    limiter = limiter or llm_limiter
+    bucket = bucket or llm_bucket
+
+    def backoff(exc: Exception, attempt: int) -> float:
+        if attempt == LLM_MAX_ATTEMPTS - 1:
+            raise exc
+        delay, is_rate_limit = _retry_delay(exc, attempt)
+        logger.warning("LLM request failed (%s); retrying in %.1fs", type(exc).__name__, delay)
+        if is_rate_limit:
+            bucket.penalize(delay)  # the next acquire waits it out
+            return 0.0
+        return delay
+
+    def call(input, config):
+        if is_cached and is_cached(input):
+            return runnable.invoke(input, config)
+        tokens = estimate_request_tokens(input)
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            bucket.acquire(tokens)
+            try:
+                with limiter:
+                    result = runnable.invoke(input, config)
+            except retry_on as e:
+                time.sleep(backoff(e, attempt))
+                continue
+            bucket.settle(tokens, _used_tokens(result))
+            return result
+
+    async def acall(input, config):
+        if is_cached and is_cached(input):
+            return await runnable.ainvoke(input, config)
+        tokens = estimate_request_tokens(input)
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            await bucket.acquire_async(tokens)
+            try:
+                async with limiter:
+                    result = await runnable.ainvoke(input, config)
+            except retry_on as e:
+                await asyncio.sleep(backoff(e, attempt))
+                continue
+            bucket.settle(tokens, _used_tokens(result))
+            return result
+
+    return RunnableLambda(call, afunc=acall, name=f"limited_{runnable.get_name()}")
+
+
+__all__ = [
+    "ConcurrencyLimiter",
+    "TokenBucketLimiter",
+    "llm_limiter",
+    "llm_bucket",
+    "estimate_request_tokens",
+    "limited",
+]
@@ -26,6 +26,34 @@ def test_imports():
         print(f"❌ tone.py: {e}")
         return False
     
+    try:
+        import cache
+        print("✅ cache.py")
+    except Exception as e:
+        print(f"❌ cache.py: {e}")
+        return False
+    
+    try:
+        import rate_limit
+        print("✅ rate_limit.py")
+    except Exception as e:
+        print(f"❌ rate_limit.py: {e}")
+        return False
+    
+    try:
+        import llm_cache
+        print("✅ llm_cache.py")
+    except Exception as e:
+        print(f"❌ llm_cache.py: {e}")
+        return False
+    
+    try:
+        import llm
+        print("✅ llm.py")
+    except Exception as e:
+        print(f"❌ llm.py: {e}")
+        return False
+    
     try:
         import parsers
         print("✅ parsers.py")
@@ -61,6 +89,13 @@ def test_imports():
         print(f"❌ pipeline.py: {e}")
         return False
     
+    try:
+        import batch
+        print("✅ batch.py")
+    except Exception as e:
+        print(f"❌ batch.py: {e}")
+        return False
+    
     return True
 
 
@@ -119,6 +154,62 @@ def test_models():
         return False
 
 
+def test_fake_backend():
+    """Run content analysis and the shark panel offline on the fake LLM backend."""
+    print("\n🧩 Testing offline pipeline on the fake LLM backend...")
+    
+    import os
+    previous = os.environ.get("PITCH_LLM_BACKEND")
+    os.environ["PITCH_LLM_BACKEND"] = "fake"
+    try:
+        from main import analyze_pitch_with_viability
+        from agents import run_shark_panel
+        
+        transcript = "We help small grocery shops bill faster for 299 rupees a month."
+        analysis = analyze_pitch_with_viability(transcript)
+        assert analysis == analyze_pitch_with_viability(transcript)  # deterministic
+        print(f"✅ Content analysis: viability {analysis['business_viability']['score']}/100")
+        
+        consolidated = analyze_pitch_with_viability(transcript, scoring_mode="consolidated")
+        assert set(consolidated["dimensions"]) == set(analysis["dimensions"])
+        print("✅ Consolidated scoring mode")
+        
+        panel = run_shark_panel(transcript, {"confidence_score": 7.0}, analysis)
+        print(f"✅ Shark panel: {panel['panel_final_recommendation']}")
+        return True
+    except Exception as e:
+        print(f"❌ Fake backend test failed: {e}")
+        return False
+    finally:
+        if previous is None:
+            os.environ.pop("PITCH_LLM_BACKEND", None)
+        else:
+            os.environ["PITCH_LLM_BACKEND"] = previous
+
+
+def test_condense_chunks():
+    """Check that condensation chunks stay within their token budget."""
+    print("\n✂️  Testing transcript chunking...")
+    
+    try:
+        from main import _condense_plan, _fallback_segments, estimate_tokens
+        
+        transcript = " ".join(f"word{i % 97} extraordinarily" for i in range(5000))
+        for max_tokens in (50, 400, 2500):
+            chunks = _fallback_segments(transcript, max_tokens)
+            assert all(estimate_tokens(c["text"]) <= max_tokens for c in chunks)
+            assert " ".join(c["text"] for c in chunks) == transcript
+        
+        # transcripts without whisper segments take the fallback path
+        chunks = _condense_plan(transcript, None, budget=1000, chunk_tokens=400)
+        assert chunks and all(estimate_tokens(c["text"]) <= 400 for c in chunks)
+        print(f"✅ {len(chunks)} chunks, largest ~{max(estimate_tokens(c['text']) for c in chunks)} tokens")
+        return True
+    except Exception as e:
+        print(f"❌ Chunking test failed: {e!r}")
+        return False
+
+
 def main():
     """Run all tests."""
     print("=" * 60)
@@ -137,6 +228,12 @@ def main():
     # Test models
     results.append(("Models", test_models()))
     
+    # Test offline LLM backend
+    results.append(("Fake LLM backend", test_fake_backend()))
+    
+    # Test condensation chunking
+    results.append(("Transcript chunking", test_condense_chunks()))
+    
     # Summary
     print("\n" + "=" * 60)
     print("📊 Test Summary")
@@ -1,44 +1,181 @@
+import concurrent.futures
+import multiprocessing
+import threading
 import librosa
 import numpy as np
-from typing import Dict
+from scipy import fft as sp_fft
+from scipy.signal import find_peaks
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple, Union
 
+from audio import iter_audio_chunks
 
-def analyze_tone(audio_path: str) -> Dict:
-    """Compute enhanced vocal delivery metrics from audio.
+SAMPLE_RATE = 16000
 
-    Returns a dict with:
-      - pitch_mean, pitch_std: pitch contour statistics
-      - energy_mean, energy_std: loudness/volume statistics
-      - speaking_rate: approximate tempo
-      - silence_ratio: proportion of silence in audio
-      - confidence_score: 0-100 based on energy and silence
-      - expressiveness_score: 0-100 based on pitch and energy variation
-      - delivery_score: 0-100 overall delivery quality
+# Shared framing for every feature: 64 ms frames with a 16 ms hop at 16 kHz
+FRAME_LENGTH = 1024
+HOP_LENGTH = 256
+
+# Pitch search range (Hz) and silence threshold (dB below the loudest frame)
+FMIN = 50.0
+FMAX = 300.0
+TOP_DB = 30.0
+
+# Envelope context (s) on each side of a syllable peak used to judge its prominence
+SYLLABLE_CONTEXT_SEC = 1.0
+
+# Frames processed per block when estimating pitch and energy (bounds peak memory)
+_PITCH_BLOCK = 4096
+
+
+def frame_signal(y: np.ndarray, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """Return a (n_frames, frame_length) strided view of `y` (zero-padded if shorter than one frame)."""
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    return np.lib.stride_tricks.sliding_window_view(y, frame_length)[::hop_length]
+
+
+def frame_rms(y: np.ndarray, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """Per-frame RMS of `frame_signal(y)` without building a float64 frame matrix.
+
+    Each frame's energy is the difference of a running sum of squared samples,
+    computed over blocks of frames so memory stays bounded on long recordings.
     """
-    # 1. Load audio
-    y, sr = librosa.load(audio_path, sr=16000)
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    n_frames = (len(y) - frame_length) // hop_length + 1
+    energy = np.empty(n_frames)
+    for start in range(0, n_frames, _PITCH_BLOCK):
+        stop = min(n_frames, start + _PITCH_BLOCK)
+        span = y[start * hop_length:(stop - 1) * hop_length + frame_length]
+        csum = np.concatenate(([0.0], np.cumsum(np.square(span, dtype=np.float64))))
+        offsets = np.arange(stop - start) * hop_length
+        energy[start:stop] = csum[offsets + frame_length] - csum[offsets]
+    return np.sqrt(np.maximum(energy, 0.0) / frame_length)
 
-    # ========= TONE & VOCAL DELIVERY FEATURES =========
-    # A) Pitch contour → how high/low & how much it varies
-    f0 = librosa.yin(y, fmin=50, fmax=300, sr=sr)
-    pitch_mean = float(np.nanmean(f0))
-    pitch_std = float(np.nanstd(f0))  # variation → monotone vs expressive
 
-    # B) Energy (volume) → how loud & dynamic the voice is
-    rms = librosa.feature.rms(y=y)[0]
-    energy_mean = float(np.mean(rms))
-    energy_std = float(np.std(rms))  # variation → flat vs energetic
+def estimate_pitch(
+    frames: np.ndarray,
+    sr: int = SAMPLE_RATE,
+    fmin: float = FMIN,
+    fmax: float = FMAX,
+    mask: np.ndarray = None,
+) -> np.ndarray:
+    """Per-frame f0 (Hz) from the peak of the FFT autocorrelation within [fmin, fmax].
 
-    # C) Speaking rate / pace (approx)
-    tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-    speaking_rate = float(tempo)
+    Only frames where `mask` is True are analysed (all frames if no mask), so the
+    cost scales with the number of selected frames. Frames are processed in
+    blocks so memory stays bounded on long recordings. Frames that are masked
+    out or have no energy get NaN.
+    """
+    n_frames, frame_length = frames.shape
+    selected = np.arange(n_frames) if mask is None else np.flatnonzero(mask)
+    lag_min = int(np.floor(sr / fmax))
+    lag_max = min(int(np.ceil(sr / fmin)), frame_length - 2)
+    # shortest fast FFT size that keeps lags up to lag_max free of circular wrap-around
+    n_fft = sp_fft.next_fast_len(frame_length + lag_max + 1, real=True)
+    window = np.hanning(frame_length).astype(np.float32)
+
+    f0 = np.full(n_frames, np.nan)
+    for start in range(0, len(selected), _PITCH_BLOCK):
+        rows_idx = selected[start:start + _PITCH_BLOCK]
+        block = frames[rows_idx] * window
+        spec = sp_fft.rfft(block, n=n_fft, axis=1)
+        acf = sp_fft.irfft(spec.real ** 2 + spec.imag ** 2, n=n_fft, axis=1)
+        energy = acf[:, 0]
+        search = acf[:, lag_min:lag_max + 1]
+        best = np.argmax(search, axis=1)
+
+        # parabolic interpolation around the peak for sub-sample lag resolution
+        idx = np.clip(best, 1, search.shape[1] - 2)
+        rows = np.arange(len(block))
+        a, b, c = search[rows, idx - 1], search[rows, idx], search[rows, idx + 1]
+        denom = a - 2 * b + c
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (a - c) / np.where(denom == 0, 1, denom), 0.0)
+        lag = lag_min + idx + np.clip(shift, -1, 1)
+
+        block_f0 = sr / lag
+        block_f0[energy <= 1e-10] = np.nan
+        f0[rows_idx] = block_f0
+    return f0
+
+
+def _syllable_peaks(env_db: np.ndarray, sr: int = SAMPLE_RATE, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """Indices of syllable-nucleus peaks in a frame loudness envelope (dB).
+
+    The envelope is smoothed over ~50 ms and peaks must be ~100 ms apart with
+    3 dB prominence. Prominence is measured within SYLLABLE_CONTEXT_SEC of
+    each peak, so a peak gets the same verdict on any slice of the envelope
+    that holds that much context around it.
+    """
+    smooth = max(1, int(0.05 * sr / hop_length))
+    env_smooth = np.convolve(env_db, np.ones(smooth) / smooth, mode="same")
+    # stay clear of the slice edges, where the smoothing sees zero padding
+    half_window = int(SYLLABLE_CONTEXT_SEC * sr / hop_length) - smooth
+    peaks, _ = find_peaks(
+        env_smooth,
+        distance=max(1, int(0.1 * sr / hop_length)),
+        prominence=3.0,
+        wlen=2 * half_window + 1,
+    )
+    return peaks
+
+
+def speaking_rate_from_envelope(
+    rms: np.ndarray,
+    voiced: np.ndarray,
+    duration_sec: float,
+    sr: int = SAMPLE_RATE,
+    hop_length: int = HOP_LENGTH,
+) -> float:
+    """Approximate syllables per minute from peaks of the frame energy envelope.
+
+    Syllable nuclei show up as loudness peaks at least ~100 ms apart; only
+    peaks on non-silent frames are counted.
+    """
+    if duration_sec <= 0 or not voiced.any():
+        return 0.0
+    env_db = 20 * np.log10(np.maximum(rms, 1e-10))
+    peaks = _syllable_peaks(env_db, sr, hop_length)
+    n_syllables = int(np.count_nonzero(voiced[peaks]))
+    return float(n_syllables / duration_sec * 60.0)
+
+
+def extract_features(y: np.ndarray, sr: int = SAMPLE_RATE) -> Dict[str, np.ndarray]:
+    """Frame `y` once and derive every per-frame feature from the shared frames.
+
+    Returns arrays of length n_frames:
+      - rms: frame energy
+      - voiced: True where the frame is within TOP_DB of the loudest frame
+      - f0: pitch estimate in Hz, NaN on silent frames
+
+    The non-silent frames are found first and pitch is only estimated on them,
+    so pauses cost nothing and do not skew the pitch statistics.
+    """
+    frames = frame_signal(y)
+    rms = frame_rms(y)
+    ref = rms.max() if rms.size and rms.max() > 0 else 1.0
+    voiced = 20 * np.log10(np.maximum(rms, 1e-10) / ref) > -TOP_DB
+    f0 = estimate_pitch(frames, sr, mask=voiced)
+    return {"rms": rms, "voiced": voiced, "f0": f0}
+
+
+def _nan_stats(values: np.ndarray) -> tuple:
+    """(mean, std) ignoring NaNs; (0.0, 0.0) if nothing is defined."""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return 0.0, 0.0
+    return float(np.mean(values)), float(np.std(values))
 
-    # D) Pauses / silence ratio (very rough)
-    intervals = librosa.effects.split(y, top_db=30)  # non-silent segments
-    total_speech = sum((end - start) for start, end in intervals) / sr
-    total_duration = len(y) / sr
-    silence_ratio = float(1 - total_speech / total_duration)
 
+def score_delivery(
+    pitch_mean: float,
+    pitch_std: float,
+    energy_mean: float,
+    energy_std: float,
+    speaking_rate: float,
+    silence_ratio: float,
+) -> Dict:
+    """Turn raw delivery statistics into the tone_scores dict (with 0-100 scores)."""
     # ========= SIMPLE RULE-BASED SCORING (0–100) =========
     # Confidence score (energy + low silence)
     confidence = 0
@@ -68,4 +205,299 @@ def analyze_tone(audio_path: str) -> Dict:
     }
 
 
-__all__ = ["analyze_tone"]
+def analyze_tone(audio_path: Union[str, np.ndarray]) -> Dict:
+    """Compute enhanced vocal delivery metrics from audio.
+
+    `audio_path` is either a file path or a mono float32 buffer already
+    sampled at 16 kHz (as returned by `audio.load_audio`).
+
+    All features come from a single framing pass (see `extract_features`).
+
+    Returns a dict with:
+      - pitch_mean, pitch_std: pitch contour statistics
+      - energy_mean, energy_std: loudness/volume statistics
+      - speaking_rate: approximate syllables per minute
+      - silence_ratio: proportion of silence in audio
+      - confidence_score: 0-100 based on energy and silence
+      - expressiveness_score: 0-100 based on pitch and energy variation
+      - delivery_score: 0-100 overall delivery quality
+    """
+    # 1. Load audio (skip decode + resample if we were handed samples)
+    if isinstance(audio_path, np.ndarray):
+        y, sr = audio_path, SAMPLE_RATE
+    else:
+        y, sr = librosa.load(audio_path, sr=SAMPLE_RATE)
+
+    # ========= TONE & VOCAL DELIVERY FEATURES =========
+    feats = extract_features(y, sr)
+    total_duration = len(y) / sr
+
+    # A) Pitch contour → how high/low & how much it varies
+    pitch_mean, pitch_std = _nan_stats(feats["f0"])  # std: variation → monotone vs expressive
+
+    # B) Energy (volume) → how loud & dynamic the voice is
+    energy_mean = float(np.mean(feats["rms"]))
+    energy_std = float(np.std(feats["rms"]))  # variation → flat vs energetic
+
+    # C) Speaking rate / pace (syllable nuclei per minute)
+    speaking_rate = speaking_rate_from_envelope(feats["rms"], feats["voiced"], total_duration, sr)
+
+    # D) Pauses / silence ratio
+    silence_ratio = float(1 - np.mean(feats["voiced"]))
+
+    return score_delivery(pitch_mean, pitch_std, energy_mean, energy_std, speaking_rate, silence_ratio)
+
+
+class RunningStats:
+    """Streaming mean/variance (Welford, merged per batch with Chan's formula). NaNs are ignored."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        n_b = values.size
+        mean_b = float(np.mean(values))
+        m2_b = float(np.sum((values - mean_b) ** 2))
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+        self.n = n
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.n)) if self.n else 0.0
+
+
+class ToneAccumulator:
+    """Bounded-memory tone analysis over audio fed in blocks.
+
+    Frames are built across block boundaries exactly as `extract_features`
+    would, and pitch/energy are folded into running statistics, so memory does
+    not grow with recording length apart from a compact per-`summary_sec`
+    timeline (a handful of floats per bucket) used by `segment_metrics`.
+
+    The silence threshold is relative to the loudest frame seen *so far*, so
+    results can differ slightly from `analyze_tone` at the very start of a
+    recording.
+    """
+
+    def __init__(self, sr: int = SAMPLE_RATE, summary_sec: float = 0.5):
+        self.sr = sr
+        self.summary_sec = summary_sec
+        self.pitch = RunningStats()
+        self.energy = RunningStats()
+        self.n_samples = 0
+        self.n_frames = 0
+        self.n_voiced = 0
+        self.syllables = 0
+        self._ref = 0.0
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._env_carry = np.zeros(0)
+        self._voiced_carry = np.zeros(0, dtype=bool)
+        self._env_counted = 0
+        self._finalized = False
+        # per-bucket sums: energy, frames, voiced frames, pitch, pitch^2, pitched frames
+        self._timeline = np.zeros((0, 6))
+
+    def update(self, block: np.ndarray) -> None:
+        """Consume the next block of 16 kHz mono float32 samples."""
+        if self._finalized:
+            raise RuntimeError("ToneAccumulator already finalized")
+        self.n_samples += len(block)
+        buf = np.concatenate([self._tail, block]) if self._tail.size else np.asarray(block, dtype=np.float32)
+        n = 0 if len(buf) < FRAME_LENGTH else (len(buf) - FRAME_LENGTH) // HOP_LENGTH + 1
+        if n:
+            self._process(buf[:(n - 1) * HOP_LENGTH + FRAME_LENGTH])
+        self._tail = buf[n * HOP_LENGTH:].copy()
+
+    def _process(self, y: np.ndarray, final: bool = False) -> None:
+        """Fold in every frame of the samples `y`."""
+        frames = frame_signal(y)
+        rms = frame_rms(y)
+        self._ref = max(self._ref, float(rms.max()))
+        ref = self._ref if self._ref > 0 else 1.0
+        voiced = 20 * np.log10(np.maximum(rms, 1e-10) / ref) > -TOP_DB
+        f0 = estimate_pitch(frames, self.sr, mask=voiced)
+
+        self.energy.update(rms)
+        self.pitch.update(f0)
+        self._count_syllables(rms, voiced, final)
+        self._add_to_timeline(rms, voiced, f0)
+        self.n_frames += len(frames)
+        self.n_voiced += int(np.count_nonzero(voiced))
+
+    def _count_syllables(self, rms: np.ndarray, voiced: np.ndarray, final: bool) -> None:
+        # Peaks are only counted once SYLLABLE_CONTEXT_SEC of envelope follows
+        # them, and as much already-counted envelope is kept as left context.
+        # `_syllable_peaks` only looks that far around a peak, so the count does
+        # not depend on how the audio is split into blocks.
+        margin = int(SYLLABLE_CONTEXT_SEC * self.sr / HOP_LENGTH)
+        env = np.concatenate([self._env_carry, 20 * np.log10(np.maximum(rms, 1e-10))])
+        vmask = np.concatenate([self._voiced_carry, voiced])
+        counted = self._env_counted
+        cutoff = len(env) if final else max(counted, len(env) - margin)
+        if cutoff > counted:
+            peaks = _syllable_peaks(env, self.sr)
+            peaks = peaks[(peaks >= counted) & (peaks < cutoff)]
+            self.syllables += int(np.count_nonzero(vmask[peaks]))
+        keep_from = max(0, cutoff - margin)
+        self._env_carry = env[keep_from:]
+        self._voiced_carry = vmask[keep_from:]
+        self._env_counted = cutoff - keep_from
+
+    def _add_to_timeline(self, rms: np.ndarray, voiced: np.ndarray, f0: np.ndarray) -> None:
+        centers = (self.n_frames + np.arange(len(rms))) * HOP_LENGTH + FRAME_LENGTH // 2
+        buckets = (centers / self.sr / self.summary_sec).astype(int)
+        size = int(buckets[-1]) + 1
+        if size > len(self._timeline):
+            self._timeline = np.vstack([self._timeline, np.zeros((size - len(self._timeline), 6))])
+        pitched = ~np.isnan(f0)
+        f0_filled = np.where(pitched, f0, 0.0)
+        for col, weights in enumerate((rms, None, voiced, f0_filled, f0_filled ** 2, pitched)):
+            self._timeline[:size, col] += np.bincount(buckets, weights=weights, minlength=size)
+
+    def _finalize(self) -> None:
+        if self._finalized:
+            return
+        if self.n_frames == 0 and self._tail.size:
+            self._process(self._tail, final=True)
+        else:
+            self._count_syllables(np.zeros(0), np.zeros(0, dtype=bool), final=True)
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._finalized = True
+
+    def result(self) -> Dict:
+        """Global tone_scores for everything consumed so far (same keys as `analyze_tone`)."""
+        self._finalize()
+        duration = self.n_samples / self.sr
+        speaking_rate = float(self.syllables / duration * 60.0) if duration > 0 else 0.0
+        silence_ratio = float(1 - self.n_voiced / self.n_frames) if self.n_frames else 1.0
+        return score_delivery(
+            self.pitch.mean, self.pitch.std,
+            self.energy.mean, self.energy.std,
+            speaking_rate, silence_ratio,
+        )
+
+    def segment_metrics(self, segments: List[dict]) -> List[dict]:
+        """Per-segment delivery metrics aligned with `transcribe_audio` segments.
+
+        Returns one dict per segment with 'start', 'end', 'energy_mean',
+        'pitch_mean', 'pitch_std' and 'silence_ratio'.
+        """
+        self._finalize()
+        out = []
+        for seg in segments:
+            b0 = int(seg["start"] / self.summary_sec)
+            b1 = max(b0 + 1, int(np.ceil(seg["end"] / self.summary_sec)))
+            energy, frames, voiced, p_sum, p_sq, pitched = self._timeline[b0:b1].sum(axis=0) if b0 < len(self._timeline) else np.zeros(6)
+            p_mean = p_sum / pitched if pitched else 0.0
+            p_var = max(0.0, p_sq / pitched - p_mean ** 2) if pitched else 0.0
+            out.append({
+                "start": seg["start"],
+                "end": seg["end"],
+                "energy_mean": float(energy / frames) if frames else 0.0,
+                "pitch_mean": float(p_mean),
+                "pitch_std": float(np.sqrt(p_var)),
+                "silence_ratio": float(1 - voiced / frames) if frames else 1.0,
+            })
+        return out
+
+
+def analyze_tone_windowed(
+    audio: Union[str, np.ndarray, Iterable[np.ndarray]],
+    block_sec: float = 30.0,
+) -> ToneAccumulator:
+    """Run tone analysis block by block and return the filled `ToneAccumulator`.
+
+    `audio` may be a file path (streamed through ffmpeg), an in-memory 16 kHz
+    buffer, or any iterable of 16 kHz float32 blocks (e.g. `audio.iter_audio_chunks`).
+    Call `.result()` for the tone_scores dict and `.segment_metrics(segments)`
+    for the per-segment timeline.
+    """
+    if isinstance(audio, str):
+        blocks = iter_audio_chunks(audio, chunk_sec=block_sec)
+    elif isinstance(audio, np.ndarray):
+        step = int(block_sec * SAMPLE_RATE)
+        blocks = (audio[i:i + step] for i in range(0, len(audio), step))
+    else:
+        blocks = audio
+
+    acc = ToneAccumulator()
+    for block in blocks:
+        acc.update(block)
+    return acc
+
+
+_TONE_POOL = None
+_TONE_POOL_LOCK = threading.Lock()
+
+
+def _warm_tone_worker() -> None:
+    """Process-pool initializer: pay imports and first-call setup once per worker."""
+    analyze_tone_windowed(np.zeros(SAMPLE_RATE, dtype=np.float32)).result()
+
+
+def get_tone_pool(max_workers: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """Return the persistent process pool used for tone analysis, creating it on first use.
+
+    Workers are started with the `spawn` method (safe alongside the pipeline's
+    threads) and warmed up by `_warm_tone_worker`, so later jobs only pay for
+    the analysis itself. `max_workers` only applies when the pool is created.
+    """
+    global _TONE_POOL
+    with _TONE_POOL_LOCK:
+        if _TONE_POOL is None:
+            _TONE_POOL = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_tone_worker,
+            )
+        return _TONE_POOL
+
+
+def shutdown_tone_pool() -> None:
+    """Stop the persistent tone pool (a new one is created on next use)."""
+    global _TONE_POOL
+    with _TONE_POOL_LOCK:
+        if _TONE_POOL is not None:
+            _TONE_POOL.shutdown()
+            _TONE_POOL = None
+
+
+def _analyze_tone_job(audio: Union[str, np.ndarray]) -> Dict:
+    return analyze_tone_windowed(audio).result()
+
+
+def analyze_tone_many(
+    items: Sequence[Union[str, np.ndarray]],
+    max_workers: int = None,
+) -> Iterator[Tuple[int, Dict]]:
+    """Analyze many recordings on the persistent process pool.
+
+    Yields `(index, tone_scores)` pairs in completion order, where `index` is the
+    position of the item in `items`. Paths are preferred over buffers since
+    they avoid pickling the samples to the worker.
+    """
+    pool = get_tone_pool(max_workers)
+    futures = {pool.submit(_analyze_tone_job, item): i for i, item in enumerate(items)}
+    for fut in concurrent.futures.as_completed(futures):
+        yield futures[fut], fut.result()
+
+
+__all__ = [
+    "analyze_tone",
+    "analyze_tone_windowed",
+    "analyze_tone_many",
+    "get_tone_pool",
+    "shutdown_tone_pool",
+    "extract_features",
+    "score_delivery",
+    "RunningStats",
+    "ToneAccumulator",
+]
@@ -1,27 +1,406 @@
-from faster_whisper import WhisperModel
-from typing import Tuple, List
+import concurrent.futures
+import os
+import threading
+import time
+import numpy as np
+from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+from cache import artifact_cache, file_digest, make_key
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple, List, Union
 
+SAMPLE_RATE = 16000
 
-def transcribe_audio(audio_path: str, model_size: str = "small", device: str = "cpu") -> Tuple[str, List[dict]]:
-    """Transcribe the audio using faster-whisper and return (transcript, segments).
+# Process-wide registry of loaded models keyed by (model_size, device, compute_type).
+# Each entry holds a future for the model (so a load does not block lookups of
+# other models), the ctranslate2 threading layout it was loaded with, and the
+# last time it was handed out.
+_MODEL_CACHE: Dict[tuple, dict] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
 
-    Segments is a list of dicts with keys like 'start', 'end', 'text'.
+# Models not requested for this long are dropped on the next `get_whisper_model` call
+MODEL_IDLE_SEC = float(os.getenv("WHISPER_MODEL_IDLE_SEC", "600"))
+
+
+def get_whisper_model(
+    model_size: str = "small",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    cpu_threads: int = 0,
+    num_workers: int = 1,
+) -> WhisperModel:
+    """Return a shared `WhisperModel`, loading it on first use.
+
+    One copy of the weights is kept per (model_size, device, compute_type) and
+    reused across pipeline runs. Safe to call from multiple threads; a load in
+    progress only blocks callers waiting for that same model.
+
+    `num_workers` > 1 lets ctranslate2 run that many transcriptions concurrently
+    from different threads, each using `cpu_threads` intra-op threads. The
+    layout is fixed when the model is loaded: a loaded model is reused when it
+    has at least `num_workers` workers, otherwise it is replaced by one that
+    does. Models idle for MODEL_IDLE_SEC are evicted opportunistically.
+    """
+    key = (model_size, device, compute_type)
+    now = time.monotonic()
+    with _MODEL_CACHE_LOCK:
+        _evict_idle(now, MODEL_IDLE_SEC, keep=key)
+        entry = _MODEL_CACHE.get(key)
+        load = entry is None or entry["num_workers"] < num_workers
+        if load:
+            entry = {
+                "model": concurrent.futures.Future(),
+                "cpu_threads": cpu_threads,
+                "num_workers": num_workers,
+            }
+            _MODEL_CACHE[key] = entry
+        entry["last_used"] = now
+
+    if load:
+        try:
+            entry["model"].set_result(WhisperModel(
+                model_size,
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+                num_workers=num_workers,
+            ))
+        except BaseException as e:
+            with _MODEL_CACHE_LOCK:
+                if _MODEL_CACHE.get(key) is entry:
+                    del _MODEL_CACHE[key]
+            entry["model"].set_exception(e)
+            raise
+    return entry["model"].result()
+
+
+def _evict_idle(now: float, max_idle_sec: float, keep: tuple = None) -> int:
+    """Drop idle registry entries other than `keep`; the caller holds `_MODEL_CACHE_LOCK`."""
+    stale = [k for k, e in _MODEL_CACHE.items() if k != keep and now - e["last_used"] >= max_idle_sec]
+    for k in stale:
+        del _MODEL_CACHE[k]
+    return len(stale)
+
+
+def evict_idle_models(max_idle_sec: float = MODEL_IDLE_SEC) -> int:
+    """Drop models that have not been requested for `max_idle_sec` seconds.
+
+    Returns the number of models evicted. Pass 0 to clear the whole cache.
     """
-    model = WhisperModel(model_size, device=device, compute_type="int8")
+    with _MODEL_CACHE_LOCK:
+        return _evict_idle(time.monotonic(), max_idle_sec)
+
+
+def iter_transcribe_segments(
+    audio_path: Union[str, np.ndarray],
+    model_size: str = "small",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    cpu_threads: int = 0,
+) -> Iterator[dict]:
+    """Yield segment dicts ('start', 'end', 'text') as faster-whisper decodes them."""
+    model = get_whisper_model(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
     segments, info = model.transcribe(audio_path, beam_size=1, best_of=1, vad_filter=True)
 
-    texts = []
-    segments_list = []
     for seg in segments:
-        segments_list.append({
+        yield {
             "start": seg.start,
             "end": seg.end,
             "text": seg.text,
-        })
-        texts.append(seg.text)
+        }
+
+
+def split_on_silence(
+    audio: np.ndarray,
+    max_chunk_sec: float = 120.0,
+    min_silence_ms: int = 500,
+) -> List[Tuple[int, int]]:
+    """Split a 16 kHz signal into (start, end) sample ranges cut at VAD silences.
+
+    Consecutive speech regions are grouped until a chunk would exceed
+    `max_chunk_sec`; the cut is placed in the middle of the silence between
+    two regions so no word is split. Leading/trailing silence is dropped.
+    """
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=min_silence_ms))
+    if not speech:
+        return []
+
+    max_len = int(max_chunk_sec * SAMPLE_RATE)
+    chunks = []
+    chunk_start = speech[0]["start"]
+    for prev, cur in zip(speech, speech[1:]):
+        if cur["end"] - chunk_start > max_len:
+            cut = (prev["end"] + cur["start"]) // 2
+            chunks.append((chunk_start, cut))
+            chunk_start = cut
+    chunks.append((chunk_start, speech[-1]["end"]))
+    return chunks
+
+
+def _transcript_cache_key(audio_path: Union[str, np.ndarray], source_key: Optional[str], **params) -> Optional[str]:
+    """Cache key for a transcript, or None if caching is off or the source is unknown."""
+    if not artifact_cache.enabled:
+        return None
+    if source_key is None and isinstance(audio_path, str):
+        source_key = file_digest(audio_path)
+    if source_key is None:
+        return None
+    return make_key(source_key, kind="transcript", **params)
+
+
+def _cached_transcript(key: Optional[str], on_segment: Optional[Callable[[dict], None]]) -> Optional[Tuple[str, List[dict]]]:
+    """Return a cached (transcript, segments), replaying `on_segment` for each segment."""
+    cached = artifact_cache.get_json(key) if key else None
+    if cached is None:
+        return None
+    if on_segment:
+        for seg in cached["segments"]:
+            on_segment(seg)
+    return cached["transcript"], cached["segments"]
+
+
+def _store_transcript(key: Optional[str], transcript: str, segments: List[dict]) -> None:
+    if key:
+        artifact_cache.put_json(key, {"transcript": transcript, "segments": segments})
+
+
+def _transcribe_chunk(model: WhisperModel, audio: np.ndarray, offset: float) -> List[dict]:
+    segments, info = model.transcribe(audio, beam_size=1, best_of=1, vad_filter=True)
+    return [
+        {
+            "start": seg.start + offset,
+            "end": seg.end + offset,
+            "text": seg.text,
+        }
+        for seg in segments
+    ]
+
+
+def transcribe_audio_parallel(
+    audio_path: Union[str, np.ndarray],
+    model_size: str = "small",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    workers: Optional[int] = None,
+    max_chunk_sec: float = 120.0,
+    on_segment: Optional[Callable[[dict], None]] = None,
+) -> Tuple[str, List[dict]]:
+    """Transcribe long recordings by decoding silence-delimited chunks concurrently.
+
+    The audio is split with `split_on_silence` and the chunks are transcribed on
+    `workers` threads sharing one model (ctranslate2 releases the GIL and runs up
+    to `num_workers` decodes at once). Segment timestamps are shifted back to the
+    position of their chunk, and results are returned in playback order.
+    """
+    workers = workers or os.cpu_count() or 1
+    audio = decode_audio(audio_path, sampling_rate=SAMPLE_RATE) if isinstance(audio_path, str) else audio_path
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    model = get_whisper_model(
+        model_size, device=device, compute_type=compute_type,
+        cpu_threads=cpu_threads, num_workers=workers,
+    )
+
+    texts = []
+    segments_list = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [
+            ex.submit(_transcribe_chunk, model, audio[start:end], start / SAMPLE_RATE)
+            for start, end in split_on_silence(audio, max_chunk_sec=max_chunk_sec)
+        ]
+        # Collect in submission order so segments (and callbacks) stay chronological
+        for fut in futures:
+            for seg in fut.result():
+                segments_list.append(seg)
+                texts.append(seg["text"])
+                if on_segment:
+                    on_segment(seg)
 
     transcript = "".join(texts).strip()
     return transcript, segments_list
 
 
-__all__ = ["transcribe_audio"]
+def transcribe_audio(
+    audio_path: Union[str, np.ndarray],
+    model_size: str = "small",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    on_segment: Optional[Callable[[dict], None]] = None,
+    workers: int = 1,
+    source_key: Optional[str] = None,
+    cpu_threads: int = 0,
+) -> Tuple[str, List[dict]]:
+    """Transcribe the audio using faster-whisper and return (transcript, segments).
+
+    `audio_path` may also be a mono float32 16 kHz buffer (see `audio.load_audio`).
+    Segments is a list of dicts with keys like 'start', 'end', 'text'.
+    If `on_segment` is given it is called with each segment as soon as it is decoded.
+    With `workers` > 1 the audio is transcribed in parallel chunks
+    (see `transcribe_audio_parallel`). `cpu_threads` caps ctranslate2's
+    intra-op threads for the sequential path (0: library default), e.g. to
+    share the cores between several worker processes.
+
+    Results are cached on disk, keyed by the file's content hash (or by
+    `source_key` for in-memory buffers, see `audio.audio_cache_key`) and the
+    whisper parameters; a cache hit replays `on_segment` and returns at once.
+    """
+    key = _transcript_cache_key(
+        audio_path, source_key, mode="file", model_size=model_size, device=device,
+        compute_type=compute_type, workers=workers,
+    )
+    cached = _cached_transcript(key, on_segment)
+    if cached is not None:
+        return cached
+
+    if workers > 1:
+        transcript, segments_list = transcribe_audio_parallel(
+            audio_path, model_size, device, compute_type,
+            workers=workers, on_segment=on_segment,
+        )
+        _store_transcript(key, transcript, segments_list)
+        return transcript, segments_list
+
+    texts = []
+    segments_list = []
+    for seg in iter_transcribe_segments(audio_path, model_size, device, compute_type, cpu_threads=cpu_threads):
+        segments_list.append(seg)
+        texts.append(seg["text"])
+        if on_segment:
+            on_segment(seg)
+
+    transcript = "".join(texts).strip()
+    _store_transcript(key, transcript, segments_list)
+    return transcript, segments_list
+
+
+def _quietest_cut(audio: np.ndarray, search_sec: float = 5.0, frame_sec: float = 0.1) -> int:
+    """Index of the quietest `frame_sec` frame within the last `search_sec` of `audio`."""
+    frame = int(frame_sec * SAMPLE_RATE)
+    start = max(0, len(audio) - int(search_sec * SAMPLE_RATE))
+    n_frames = (len(audio) - start) // frame
+    if n_frames < 2:
+        return len(audio)
+    frames = audio[start:start + n_frames * frame].reshape(n_frames, frame)
+    quietest = int(np.argmin(np.mean(frames ** 2, axis=1)))
+    return start + quietest * frame + frame // 2
+
+
+def transcribe_stream(
+    chunks: Iterable[np.ndarray],
+    model_size: str = "small",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    window_sec: float = 30.0,
+    on_segment: Optional[Callable[[dict], None]] = None,
+    source_key: Optional[str] = None,
+) -> Tuple[str, List[dict]]:
+    """Transcribe 16 kHz float32 chunks as they arrive (see `audio.iter_audio_chunks`).
+
+    Incoming samples are buffered until `window_sec` seconds are available; the
+    window is then cut at its quietest point near the end, transcribed, and the
+    remainder carried into the next window. Segment timestamps are global.
+
+    If `source_key` identifies the audio (see `audio.audio_cache_key`) the
+    artifact cache is consulted first; on a hit the chunks are not read and a
+    closable `chunks` iterator is closed so its producer can stop. The
+    transcript is only stored once `chunks` is exhausted without an error.
+    """
+    key = _transcript_cache_key(
+        None, source_key, mode="stream", model_size=model_size, device=device,
+        compute_type=compute_type, window_sec=window_sec,
+    )
+    cached = _cached_transcript(key, on_segment)
+    if cached is not None:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        return cached
+
+    model = get_whisper_model(model_size, device=device, compute_type=compute_type)
+    window = int(window_sec * SAMPLE_RATE)
+
+    texts = []
+    segments_list = []
+
+    def flush(audio: np.ndarray, offset: int):
+        for seg in _transcribe_chunk(model, audio, offset / SAMPLE_RATE):
+            segments_list.append(seg)
+            texts.append(seg["text"])
+            if on_segment:
+                on_segment(seg)
+
+    pending = []
+    pending_len = 0
+    offset = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_len += len(chunk)
+        if pending_len < window:
+            continue
+        buf = np.concatenate(pending)
+        cut = _quietest_cut(buf)
+        flush(buf[:cut], offset)
+        offset += cut
+        pending = [buf[cut:]]
+        pending_len = len(buf) - cut
+
+    if pending_len:
+        flush(np.concatenate(pending), offset)
+
+    transcript = "".join(texts).strip()
+    _store_transcript(key, transcript, segments_list)
+    return transcript, segments_list
+
+
+def transcribe_many(
+    paths: Sequence[str],
+    model_size: str = "small",
+    device: str = "cpu",
+    compute_type: str = "int8",
+    batch_size: int = 8,
+) -> List[dict]:
+    """Transcribe a cohort of recordings with one model and batched inference.
+
+    Each file is split into VAD chunks and `batch_size` chunks are decoded per
+    forward pass via faster-whisper's `BatchedInferencePipeline`. The next file
+    is decoded from disk while the current one is being transcribed.
+
+    Returns one dict per input, in input order, with keys 'path', 'transcript',
+    'segments' and 'elapsed_sec' (wall-clock time spent on that file).
+    """
+    if not paths:
+        return []
+
+    model = get_whisper_model(model_size, device=device, compute_type=compute_type)
+    batched = BatchedInferencePipeline(model=model)
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as loader:
+        next_audio = loader.submit(decode_audio, paths[0], SAMPLE_RATE)
+        for i, path in enumerate(paths):
+            started = time.perf_counter()
+            audio = next_audio.result()
+            if i + 1 < len(paths):
+                next_audio = loader.submit(decode_audio, paths[i + 1], SAMPLE_RATE)
+
+            segments, info = batched.transcribe(audio, beam_size=1, best_of=1, batch_size=batch_size)
+            segments_list = [
+                {"start": seg.start, "end": seg.end, "text": seg.text}
+                for seg in segments
+            ]
+            results.append({
+                "path": path,
+                "transcript": "".join(seg["text"] for seg in segments_list).strip(),
+                "segments": segments_list,
+                "elapsed_sec": time.perf_counter() - started,
+            })
+    return results
+
+
+__all__ = [
+    "transcribe_audio",
+    "transcribe_audio_parallel",
+    "transcribe_many",
+    "transcribe_stream",
+    "iter_transcribe_segments",
+    "split_on_silence",
+    "get_whisper_model",
+    "evict_idle_models",
+]